@@ -1,22 +1,84 @@
 # -*- coding: utf-8 -*-
 """
 Package for running Geant4 simulations
+
+Submodules and the Geant4 bindings are imported on first attribute
+access, so command-line tools that only handle HDF5 output do not pay
+for importing Geant4.
 """
 
 __version__ = '0.1.0'
 
 import os, sys
-f = open(os.devnull, 'w')
-temp = sys.stdout
-sys.stdout = f
-import Geant4 as g4
-sys.stdout = temp
-
-from .boost import *
-from .core import build_transformation
-from .core import transform
-from .core import in_volume
-from .core import gamma_to_edge
-from .core import edge_to_gamma
-from .tasks import *
-from .generators import repeater
+import importlib
+
+_submodules = [
+    'boost', 'core', 'tasks', 'sparse', 'pyramid', 'meshcache', 'scan',
+    'generators']
+
+_attributes = {
+    'build_transformation' : 'core',
+    'transform' : 'core',
+    'in_volume' : 'core',
+    'gamma_to_edge' : 'core',
+    'edge_to_gamma' : 'core',
+    'storage_options' : 'core',
+    'storage_options_like' : 'core',
+    'create_dataset' : 'core',
+    'default_cache_dir' : 'core',
+    'Task' : 'tasks',
+    'ParallelTaskRunner' : 'tasks',
+    'SerialTaskRunner' : 'tasks',
+    'RunMonteCarloSingleIndex' : 'tasks',
+    'RunMonteCarlo' : 'tasks',
+    'ScanReader' : 'scan',
+    'repeater' : 'generators' }
+
+def _import_geant4():
+    # Geant4 prints a banner on import
+    if 'Geant4' in sys.modules:
+        return sys.modules['Geant4']
+    f = open(os.devnull, 'w')
+    temp = sys.stdout
+    sys.stdout = f
+    try:
+        import Geant4 as g4
+    finally:
+        sys.stdout = temp
+        f.close()
+    return g4
+
+def _import_submodule(name):
+    if name in ('boost', 'generators'):
+        _import_geant4()
+    return importlib.import_module('.' + name, __name__)
+
+def __getattr__(name):
+    if name == 'g4':
+        return _import_geant4()
+    if name in _submodules:
+        return _import_submodule(name)
+    if name in _attributes:
+        result = getattr(_import_submodule(_attributes[name]), name)
+    elif name.startswith('__'):
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name))
+    else:
+        # other submodules (e.g., command-line tools), then bindings
+        try:
+            return importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != __name__ + '.' + name:
+                raise
+        boost = _import_submodule('boost')
+        try:
+            result = getattr(boost, name)
+        except AttributeError:
+            raise AttributeError(
+                'module {!r} has no attribute {!r}'.format(
+                    __name__, name)) from None
+    globals()[name] = result
+    return result
+
+def __dir__():
+    return sorted(set(globals()) | set(_submodules) | set(_attributes))
@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 import os, sys, random
+from contextlib import ExitStack
 import argparse
 import numpy as np
 import toml
 import asteval
-from pbpl import geant4
 # import Geant4 as g4
 # from Geant4.hepunit import *
 import h5py
@@ -22,6 +22,28 @@ Example:
 .. code-block:: sh
 
   pbpl-geant4-combine-deposition combine-deposition.toml
+
+The output deposition is a weighted expression of the keyed inputs:
+
+.. code-block:: toml
+
+  [[Input]]
+  Key = 'A'
+  Filename = 'a.h5'
+  Group = 'Dump'
+  RunIndices = [[0], [1], [2]]
+
+  [[Input]]
+  Key = 'B'
+  Filename = 'b.h5'
+  Group = 'Dump'
+  RunIndices = [[0], [1], [2]]
+
+  [Output]
+  Filename = 'out.h5'
+  Group = 'Dump'
+  Expression = '0.25*A + 0.75*B'
+  ChunkSize = 16
 ''')
     parser.add_argument(
         'config_filename', metavar='conf-file',
@@ -35,52 +57,96 @@ def get_args():
     args.conf = toml.load(args.config_filename)
     return args
 
-def get_input(conf):
+def get_run_indices(c):
+    if 'RunIndices' in c:
+        return [tuple(x) for x in c['RunIndices']]
+    else:
+        return [tuple(c['RunIndex'])]
+
+def get_input(conf, stack):
+    # Inputs are opened (and closed by stack), but not read.
+    # Deposition datasets are left on disk and evaluated chunk by chunk
+    # in combine().
     edep = {}
+    run_indices = {}
     for c in conf:
-        with h5py.File(c['Filename'], 'r') as fin:
-            run_index = tuple(c['RunIndex'])
-            _num_events = fin['num_events'][run_index]
-            gin = fin[c['Group']]
-            _edep = gin['edep'][run_index]*MeV
-            _xbin = gin['xbin'][:]*mm
-            _ybin = gin['ybin'][:]*mm
-            _zbin = gin['zbin'][:]*mm
-            if len(edep) == 0:
-                xbin = _xbin
-                ybin = _ybin
-                zbin = _zbin
-                num_events = _num_events
-            else:
-                assert(np.array_equal(xbin, _xbin))
-                assert(np.array_equal(ybin, _ybin))
-                assert(np.array_equal(zbin, _zbin))
-                assert(num_events == _num_events)
-            edep[c['Key']] = _edep
-    return edep, xbin, ybin, zbin, num_events
+        fin = stack.enter_context(h5py.File(c['Filename'], 'r'))
+        _run_indices = get_run_indices(c)
+        _num_events = np.array([fin['num_events'][i] for i in _run_indices])
+        gin = fin[c['Group']]
+        _xbin = gin['xbin'][:]*mm
+        _ybin = gin['ybin'][:]*mm
+        _zbin = gin['zbin'][:]*mm
+        if len(edep) == 0:
+            xbin = _xbin
+            ybin = _ybin
+            zbin = _zbin
+            num_events = _num_events
+        else:
+            assert(np.array_equal(xbin, _xbin))
+            assert(np.array_equal(ybin, _ybin))
+            assert(np.array_equal(zbin, _zbin))
+            assert(np.array_equal(num_events, _num_events))
+        edep[c['Key']] = gin['edep']
+        run_indices[c['Key']] = _run_indices
+    return edep, run_indices, xbin, ybin, zbin, num_events
 
-def main():
-    args = get_args()
-    conf = args.conf
-    edep, xbin, ybin, zbin, num_events = get_input(conf['Input'])
+def combine(conf):
+    """Write Output of configuration (see get_parser() epilog)."""
+    with ExitStack() as stack:
+        combine_inputs(conf, *get_input(conf['Input'], stack))
+
+def combine_inputs(conf, edep, run_indices, xbin, ybin, zbin, num_events):
+    expression = conf['Output'].get('Expression', ' + '.join(edep.keys()))
+    chunk_size = conf['Output'].get('ChunkSize', 16)
+    num_runs = len(num_events)
+    for k, v in run_indices.items():
+        if len(v) != num_runs:
+            raise ValueError(
+                "input '{}' has {} run indices (expected {})".format(
+                    k, len(v), num_runs))
+
+    labels = [
+        ','.join(str(x) for x in q) for q in list(run_indices.values())[0]]
+    aeval = asteval.Interpreter(use_numpy=True)
+    bins_shape = (len(xbin)-1, len(ybin)-1, len(zbin)-1)
 
     with h5py.File(conf['Output']['Filename'], 'w') as fout:
-        fout['num_events'] = np.array((num_events,))
-        fout['i0'] = np.array((np.string_('yo'),))
+        fout['num_events'] = num_events
+        fout['i0'] = np.array([np.string_(x) for x in labels])
+        fout['i0'].attrs.create('label', np.string_('RunIndex'))
         if 'Group' in conf['Output']:
             gout = fout.create_group(conf['Output']['Group'])
         else:
             gout = fout
-        gout['edep'] = ((edep['A'] + edep['B'])/MeV).astype('float32')[np.newaxis,:]
-        gout['edep'].attrs.create('num_events', num_events)
-        gout['edep'].attrs.create('unit', np.string_('MeV'))
+        dset = gout.create_dataset(
+            'edep', shape=(num_runs,) + bins_shape, dtype='float32')
+        dset.attrs.create('num_events', num_events)
+        dset.attrs.create('unit', np.string_('MeV'))
+
+        # Expression is evaluated one x-slab chunk at a time so that
+        # only chunk_size*Ny*Nz values per input are held in memory.
+        for i in range(num_runs):
+            for j0 in range(0, bins_shape[0], chunk_size):
+                chunk = slice(j0, min(j0 + chunk_size, bins_shape[0]))
+                for k, v in edep.items():
+                    aeval.symtable[k] = v[run_indices[k][i] + (chunk,)]*MeV
+                result = aeval(expression)
+                if len(aeval.error) > 0:
+                    raise ValueError(
+                        "could not evaluate '{}': {}".format(
+                            expression, aeval.error[0].get_error()))
+                dset[i, chunk] = (result/MeV).astype('float32')
+
         gout['xbin'] = xbin/mm
         gout['ybin'] = ybin/mm
         gout['zbin'] = zbin/mm
         for dset_name in ['xbin', 'ybin', 'zbin']:
             gout[dset_name].attrs.create('unit', np.string_('mm'))
-        fout.close()
 
+def main():
+    args = get_args()
+    combine(args.conf)
     return 0
 
 if __name__ == '__main__':
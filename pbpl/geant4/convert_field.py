@@ -5,6 +5,8 @@ from argparse import RawDescriptionHelpFormatter
 import numpy as np
 import h5py
 import re as regex
+import itertools
+from tempfile import NamedTemporaryFile
 from pbpl.common.units import *
 
 class CstAsciiConverter:
@@ -22,7 +24,7 @@ class CstAsciiConverter:
         else:
             return False
 
-    def convert(args):
+    def convert(args, fout):
         with open(args.input, 'r') as f:
             line = f.readline()
             m = regex.search('x\s+\[(\S+)\]', line)
@@ -51,29 +53,73 @@ class CstAsciiConverter:
             dtype = np.float64
         else:
             dtype = np.float32
+        if args.complex:
+            raise ValueError('complex CST ASCII fields are not supported')
 
         # CST writes out grid in `X-major order' (i.e., Fortran order):
         #   X is fastest index, and Z is slowest index
-        raw = np.loadtxt(args.input, skiprows=2, unpack=True, dtype=dtype)
-        xvals, yvals, zvals = [
-            np.sort(np.unique(x))*length_scale for x in raw[0:3]]
-        def f2c(A):
-            return A.reshape(3, len(xvals), len(yvals), len(zvals), order='F')
-        pos = f2c(raw[0:3])
-        if args.complex:
-            # field = f2c(raw[3:6]) + 1j*f2c(raw[6:9])
-            field = f2c(raw[[3,5,7]]) + 1j*f2c(raw[[6,8,10]])
-            assert(False)
-        else:
-            # field = f2c(raw[3:6])
-            field = f2c(raw[[3,5,7]])
+        # The file is parsed in blocks of whole z-slabs.  The grid is
+        # inferred from the first slab, and each block of slabs is
+        # appended to the output as soon as it is parsed.
+        with open(args.input, 'r') as f:
+            f.readline()
+            f.readline()
+            # np.loadtxt has a C parser since numpy 1.23.  Parsing
+            # 200k rows of 9 columns takes 0.14 s with loadtxt and
+            # 0.22 s with np.fromstring(''.join(lines), sep=' ') (numpy
+            # 2.4, float32 or float64), so loadtxt is kept.
+            def read_rows(num_rows):
+                lines = list(itertools.islice(f, num_rows))
+                if len(lines) == 0:
+                    return np.zeros((0, 9), dtype=dtype)
+                return np.loadtxt(lines, dtype=dtype, ndmin=2)
 
-        field *= field_scale
+            raw = read_rows(args.chunk_size)
+            while True:
+                z_changed = np.nonzero(raw[:,2] != raw[0,2])[0]
+                if len(z_changed) > 0:
+                    slab_size = z_changed[0]
+                    break
+                more = read_rows(args.chunk_size)
+                if len(more) == 0:
+                    slab_size = len(raw)
+                    break
+                raw = np.concatenate((raw, more))
+            y_changed = np.nonzero(raw[:slab_size,1] != raw[0,1])[0]
+            Nx = y_changed[0] if len(y_changed) > 0 else slab_size
+            Ny = slab_size // Nx
+            if Nx * Ny != slab_size:
+                raise ValueError('CST grid is not rectilinear')
+            xvals = raw[:Nx,0]*length_scale
+            yvals = raw[:slab_size:Nx,1]*length_scale
+            slab_pos = raw[:slab_size,0:2].copy()
+            slabs_per_block = max(1, args.chunk_size // slab_size)
 
-        if field_type == 'B':
-            return xvals, yvals, zvals, field, None
-        elif field_type == 'E':
-            return xvals, yvals, zvals, None, field
+            fout['xvals'] = xvals
+            dset = fout.create_dataset(
+                field_type + '_field', shape=(3, Nx, Ny, 0),
+                maxshape=(3, Nx, Ny, None), chunks=(3, Nx, Ny, 1),
+                dtype=dtype, compression='gzip')
+            zvals = []
+            while len(raw) > 0:
+                num_slabs, remainder = divmod(len(raw), slab_size)
+                if remainder != 0:
+                    more = read_rows(slab_size - remainder)
+                    if len(more) != slab_size - remainder:
+                        raise ValueError('incomplete CST z-slab')
+                    raw = np.concatenate((raw, more))
+                    num_slabs += 1
+                A = raw.reshape(num_slabs, slab_size, raw.shape[1])
+                if not np.all(A[:,:,0:2] == slab_pos):
+                    raise ValueError('CST grid is not rectilinear')
+                zvals.extend(A[:,0,2]*length_scale)
+                field = A[:,:,[3,5,7]].reshape(num_slabs, Ny, Nx, 3)
+                n = dset.shape[3]
+                dset.resize(n + num_slabs, axis=3)
+                dset[:,:,:,n:] = field_scale * field.transpose((3, 2, 1, 0))
+                raw = read_rows(slabs_per_block * slab_size)
+            fout['yvals'] = yvals
+            fout['zvals'] = np.array(zvals, dtype=dtype)
 
 def read_with_unit(fin, dataset_name):
     dset = fin[dataset_name]
@@ -99,33 +145,39 @@ class CstHdfConverter:
             pass
         return False
 
-    def convert(args):
+    def convert(args, fout):
+        if args.double:
+            dtype = np.float64
+        else:
+            dtype = np.float32
+
+        # 'B-Field' is a compound [Nz, Ny, Nx] dataset.  It is converted
+        # in blocks of z-slabs so that memory is bounded by one block.
         with h5py.File(args.input, 'r') as fin:
             xvals = read_with_unit(fin, 'Mesh line x')
             yvals = read_with_unit(fin, 'Mesh line y')
             zvals = read_with_unit(fin, 'Mesh line z')
             dset = fin['B-Field']
-            val = dset[:]
             unit = dset.attrs['unit'].decode('utf-8')
             if unit in ['Vs/m^2', 'V.s/m^2']:
                 unit_scale = tesla
             else:
                 raise ValueError(
                     "unfamiliar CST unit '{}'".format(unit))
-            field = unit_scale * np.array(
-                (val['x']['re'], val['y']['re'], val['z']['re']),
-                dtype=np.float32).transpose((0, 3, 2, 1))
-        if args.double:
-            dtype = np.float64
-        else:
-            dtype = np.float32
-
-        return (
-            xvals.astype(dtype),
-            yvals.astype(dtype),
-            zvals.astype(dtype),
-            field.astype(dtype),
-            None)
+            Nz, Ny, Nx = dset.shape
+            fout['xvals'] = xvals.astype(dtype)
+            fout['yvals'] = yvals.astype(dtype)
+            fout['zvals'] = zvals.astype(dtype)
+            dout = fout.create_dataset(
+                'B_field', shape=(3, Nx, Ny, Nz), chunks=(3, Nx, Ny, 1),
+                dtype=dtype, compression='gzip')
+            slabs_per_block = max(1, args.chunk_size // (Nx * Ny))
+            for z0 in range(0, Nz, slabs_per_block):
+                z1 = min(z0 + slabs_per_block, Nz)
+                val = dset[z0:z1]
+                dout[:,:,:,z0:z1] = unit_scale * np.array(
+                    (val['x']['re'], val['y']['re'], val['z']['re']),
+                    dtype=dtype).transpose((0, 3, 2, 1))
 
 converters = [CstAsciiConverter, CstHdfConverter]
 converters_dict = {x.name:x for x in converters}
@@ -146,6 +198,32 @@ def get_parser():
     parser.add_argument(
         '--double', action='store_true',
         help='Store double precision (Store single precision by default)')
+    parser.add_argument(
+        '--image', metavar='IMAGE', default=None,
+        help='Also write uncompressed field image for shared, ' +
+        'memory-mapped loading (e.g., /dev/shm/field.img).  If IN-FILE ' +
+        'is already a pbpl-geant4 HDF5 field, only the image is written')
+    parser.add_argument(
+        '--mirror', metavar='AXIS=SIGNS', action='append', default=[],
+        help='Declare mirror symmetry through plane AXIS=0 and store ' +
+        'only AXIS>=0.  SIGNS gives sign of (Bx,By,Bz) at -AXIS, ' +
+        "e.g., 'x=-++'.  May be repeated")
+    parser.add_argument(
+        '--crop', metavar='AXIS=MIN:MAX', action='append', default=[],
+        help='Keep only grid cells overlapping MIN<=AXIS<=MAX (mm), ' +
+        "e.g., 'z=-100:250'.  May be repeated")
+    parser.add_argument(
+        '--resample', metavar='AXIS=SPACING', action='append', default=[],
+        help='Linearly resample AXIS to a uniform grid with spacing ' +
+        "no larger than SPACING (mm), e.g., 'z=2'.  May be repeated")
+    parser.add_argument(
+        '--drop-zero', metavar='TOL', type=float, nargs='?', const=0.0,
+        default=None,
+        help='Drop field components whose magnitude never exceeds ' +
+        'TOL (default=0)')
+    parser.add_argument(
+        '--chunk-size', metavar='INT', type=int, default=1000000,
+        help='Number of grid points converted at a time (default=1000000)')
     parser.add_argument(
         '--format', metavar='FORMAT', default=None,
         help='Force input format ' +
@@ -171,9 +249,198 @@ def create_dset(f, name, A):
     dset[:] = A
 
 
-def main():
-    args = get_args()
+def is_pbpl_field(filename):
+    try:
+        with h5py.File(filename, 'r') as fin:
+            return set(['xvals', 'yvals', 'zvals', 'B_field']) <= set(fin)
+    except:
+        return False
+
+def write_image(fin, filename, chunk_size):
+    """Write B_field of pbpl-geant4 HDF5 file as an uncompressed field
+    image that ImportedMagneticField maps read-only.  See
+    ImportedMagneticField::loadImage() for the layout."""
+    axes = [fin[k][()].astype(np.float64) for k in ['xvals', 'yvals', 'zvals']]
+    shape = [len(x) for x in axes]
+    dset = fin['B_field']
+    mirror = fin.attrs.get('mirror', np.zeros(3))
+    mirror_sign = fin.attrs.get('mirror_sign', np.ones((3, 3)))
+    with open(filename, 'wb') as fout:
+        fout.write(b'PBPLFLD2')
+        fout.write(np.array(shape, dtype=np.uint64).tobytes())
+        fout.write(np.array(mirror, dtype=np.int8).tobytes())
+        fout.write(np.array(mirror_sign, dtype=np.int8).tobytes())
+        fout.write(b'\0' * 4)
+        for x in axes:
+            fout.write(x.tobytes())
+        fout.write(b'\0' * (-fout.tell() % 64))
+        slabs_per_block = max(1, chunk_size // (shape[1] * shape[2]))
+        for x0 in range(0, shape[0], slabs_per_block):
+            x1 = min(x0 + slabs_per_block, shape[0])
+            A = read_field(dset, slice(x0, x1)).astype(
+                np.float32).transpose((1, 2, 3, 0))
+            fout.write(np.ascontiguousarray(A).tobytes())
+
+def parse_mirror(specs):
+    """Parse --mirror specifications such as 'x=-++' into (mirror,
+    mirror_sign) arrays."""
+    mirror = np.zeros(3, dtype=np.int8)
+    mirror_sign = np.ones((3, 3), dtype=np.int8)
+    for spec in specs:
+        m = regex.fullmatch('([xyz])=([+-]{3})', spec)
+        if m is None:
+            raise ValueError("invalid mirror specification '{}'".format(spec))
+        i = 'xyz'.index(m.group(1))
+        mirror[i] = 1
+        mirror_sign[i] = [1 if c == '+' else -1 for c in m.group(2)]
+    return mirror, mirror_sign
 
+def parse_ranges(specs, name):
+    """Parse specifications such as 'x=-20:20' (--crop) or 'z=2'
+    (--resample) into {axis index: values}.  Lengths are in mm."""
+    result = {}
+    for spec in specs:
+        m = regex.fullmatch('([xyz])=(.+)', spec)
+        try:
+            vals = [float(x)*mm for x in m.group(2).split(':')]
+        except (AttributeError, ValueError):
+            vals = None
+        if vals is None or len(vals) != (2 if name == 'crop' else 1):
+            raise ValueError(
+                "invalid {} specification '{}'".format(name, spec))
+        result['xyz'.index(m.group(1))] = vals
+    return result
+
+def needs_reduction(args):
+    return (len(args.mirror) > 0 or len(args.crop) > 0 or
+            len(args.resample) > 0 or args.drop_zero is not None)
+
+def stored_components(dset):
+    if 'components' in dset.attrs:
+        return list(dset.attrs['components'])
+    return [0, 1, 2]
+
+def read_field(dset, *sel):
+    """Read dset[:, *sel] as all 3 components (dropped components are
+    zero)."""
+    A = dset[(slice(None),) + sel]
+    components = stored_components(dset)
+    if len(components) == 3:
+        return A
+    result = np.zeros((3,) + A.shape[1:], dtype=A.dtype)
+    result[components] = A
+    return result
+
+def interp_axis(A, axis, index, weight):
+    """Linearly interpolate A along axis at index + weight."""
+    if weight is None:
+        return np.take(A, index, axis=axis)
+    shape = [1] * A.ndim
+    shape[axis] = -1
+    w = weight.reshape(shape)
+    return (np.take(A, index, axis=axis) * (1 - w) +
+            np.take(A, index+1, axis=axis) * w)
+
+def reduce_field(fin, fout, args):
+    """Copy field from fin to fout, keeping only the fundamental region
+    of mirror-symmetric axes and the --crop box, resampling axes to the
+    --resample spacing and dropping --drop-zero components.  Fields are
+    copied in blocks of x-slabs."""
+    mirror, mirror_sign = parse_mirror(args.mirror)
+    if 'mirror' in fin.attrs:
+        # axes mirrored already keep the signs of the input
+        file_mirror = fin.attrs['mirror'].astype(np.int8)
+        file_sign = fin.attrs['mirror_sign'].astype(np.int8)
+        for i in np.nonzero(file_mirror)[0]:
+            if mirror[i] and not np.array_equal(mirror_sign[i], file_sign[i]):
+                raise ValueError(
+                    "--mirror signs of {} conflict with input".format(
+                        'xyz'[i]))
+            mirror[i] = 1
+            mirror_sign[i] = file_sign[i]
+    crop = parse_ranges(args.crop, 'crop')
+    resample = parse_ranges(args.resample, 'resample')
+
+    # per axis: source index range [lo, hi) and interpolation (index
+    # relative to lo, weight or None) of each output point
+    src_range, interp = [], []
+    for i, k in enumerate(['xvals', 'yvals', 'zvals']):
+        vals = fin[k][()]
+        lo, hi = 0, len(vals)
+        if mirror[i]:
+            i0 = np.nonzero(np.isclose(
+                vals, 0.0, rtol=0, atol=1e-6*(vals[-1]-vals[0])))[0]
+            if len(i0) == 0:
+                raise ValueError(
+                    "mirror plane {}=0 is not a grid plane".format(k[0]))
+            lo = i0[0]
+            vals = vals.copy()
+            vals[lo] = 0.0
+        if i in crop:
+            x0, x1 = crop[i]
+            lo = max(lo, np.searchsorted(vals, x0, 'right') - 1)
+            hi = min(hi, np.searchsorted(vals, x1, 'left') + 1)
+            if hi - lo < 2:
+                raise ValueError(
+                    "crop range of {} contains no grid cell".format(k[0]))
+        src = vals[lo:hi]
+        if i in resample:
+            n = int(np.ceil((src[-1] - src[0]) / resample[i][0] - 1e-9)) + 1
+            vals = np.linspace(src[0], src[-1], max(n, 2))
+            index = np.clip(
+                np.searchsorted(src, vals, 'right') - 1, 0, len(src) - 2)
+            weight = (vals - src[index]) / (src[index+1] - src[index])
+        else:
+            vals = src
+            index, weight = np.arange(len(src)), None
+        src_range.append((lo, hi))
+        interp.append((index, weight))
+        fout[k] = vals.astype(fin[k].dtype)
+    fout.attrs.create('mirror', mirror)
+    fout.attrs.create('mirror_sign', mirror_sign)
+
+    (xlo, xhi), (ylo, yhi), (zlo, zhi) = src_range
+    for dset_name in ['B_field', 'E_field']:
+        if dset_name not in fin:
+            continue
+        dset = fin[dset_name]
+        src_block = max(1, args.chunk_size // ((yhi-ylo) * (zhi-zlo)))
+        components = [0, 1, 2]
+        if args.drop_zero is not None:
+            peak = np.zeros(3)
+            for x0 in range(xlo, xhi, src_block):
+                A = read_field(
+                    dset, slice(x0, min(x0+src_block, xhi)),
+                    slice(ylo, yhi), slice(zlo, zhi))
+                peak = np.maximum(peak, np.abs(A).max(axis=(1, 2, 3)))
+            components = [j for j in range(3) if peak[j] > args.drop_zero]
+            if len(components) == 0:
+                components = [0]
+        shape = (len(components),) + tuple(len(x[0]) for x in interp)
+        dout = fout.create_dataset(
+            dset_name, shape=shape, chunks=(shape[0], 1) + shape[2:],
+            dtype=dset.dtype, compression='gzip')
+        if len(components) < 3:
+            dout.attrs.create('components', np.array(components, np.int8))
+        x_index, x_weight = interp[0]
+        slabs_per_block = max(1, args.chunk_size // (shape[2] * shape[3]))
+        for x0 in range(0, shape[1], slabs_per_block):
+            x1 = min(x0 + slabs_per_block, shape[1])
+            s0 = x_index[x0]
+            s1 = x_index[x1-1] + (1 if x_weight is None else 2)
+            A = read_field(
+                dset, slice(xlo+s0, xlo+s1), slice(ylo, yhi), slice(zlo, zhi))
+            A = A[components]
+            for axis in [2, 3]:
+                A = interp_axis(A, axis, *interp[axis-1])
+            A = interp_axis(
+                A, 1, x_index[x0:x1] - s0,
+                None if x_weight is None else x_weight[x0:x1])
+            dout[:,x0:x1] = A
+
+def convert(args):
+    """Convert raw input.  Returns name of pbpl-geant4 HDF5 file,
+    which is a temporary file if further reduction is requested."""
     format = None
     if args.format is None:
         for x in converters:
@@ -193,17 +460,45 @@ def main():
                 "'{}' is not recognized as format '{}'".format(
                     args.input, format))
 
-    xvals, yvals, zvals, B_field, E_field = converters_dict[format].convert(
-        args)
-
-    with h5py.File(args.output, 'w') as f:
-        f['xvals'] = xvals
-        f['yvals'] = yvals
-        f['zvals'] = zvals
-        if B_field is not None:
-            create_dset(f, 'B_field', B_field)
-        if E_field is not None:
-            create_dset(f, 'E_field', E_field)
+    if needs_reduction(args):
+        with NamedTemporaryFile(
+                dir=os.path.dirname(os.path.abspath(args.output)),
+                suffix='.h5', delete=False) as f:
+            filename = f.name
+    else:
+        filename = args.output
+    with h5py.File(filename, 'w') as f:
+        converters_dict[format].convert(args, f)
+    return filename
+
+def main():
+    args = get_args()
+
+    if is_pbpl_field(args.input):
+        source = args.input
+        if args.image is None and not needs_reduction(args):
+            raise ValueError(
+                "'{}' is already a pbpl-geant4 field (use --image)".format(
+                    args.input))
+    else:
+        source = convert(args)
+
+    if needs_reduction(args):
+        if os.path.abspath(args.output) == os.path.abspath(source):
+            raise ValueError('--output must differ from input')
+        with h5py.File(source, 'r') as fin:
+            with h5py.File(args.output, 'w') as fout:
+                reduce_field(fin, fout, args)
+        if source != args.input:
+            os.unlink(source)
+        source = args.output
+
+    if args.image is not None:
+        with h5py.File(source, 'r') as fin:
+            if 'B_field' in fin:
+                write_image(fin, args.image, args.chunk_size)
+
+    return 0
 
 if __name__ == '__main__':
     sys.exit(main())
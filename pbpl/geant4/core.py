@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
+import os
 import numpy as np
 from scipy.spatial.transform import Rotation
-from Geant4.hepunit import *
 
 def build_transformation(spec, length_unit=1.0, angle_unit=1.0):
     result = np.identity(4)
@@ -44,7 +44,68 @@ def in_volume(vol, x):
          x[:,2]>=vol[2,0], x[:,2]<=vol[2,1]))
 
 def gamma_to_edge(gamma):
+    from Geant4.hepunit import electron_mass_c2
     return 2*gamma**2/(2*gamma + electron_mass_c2)
 
 def edge_to_gamma(edge):
+    from Geant4.hepunit import electron_mass_c2
     return 0.5*(edge + np.sqrt(edge**2 + 2*edge*electron_mass_c2))
+
+def storage_options(conf, shape):
+    """Translate a detector 'Storage' table into h5py create_dataset()
+    keyword arguments for a dataset of the given shape.
+
+    Recognized keys: Chunks (list, one entry per dimension),
+    Compression ('gzip' or 'lzf'), CompressionLevel (gzip only),
+    Shuffle (bool) and Precision (numpy dtype name).
+    """
+    result = {}
+    if conf is None:
+        return result
+    if 'Precision' in conf:
+        result['dtype'] = conf['Precision']
+    # empty datasets cannot be chunked (nor filtered)
+    if 0 in shape:
+        return result
+    if 'Chunks' in conf and len(conf['Chunks']) == len(shape):
+        result['chunks'] = tuple(
+            max(1, min(int(c), s)) for c, s in zip(conf['Chunks'], shape))
+    if 'Compression' in conf:
+        result['compression'] = conf['Compression']
+        if 'CompressionLevel' in conf:
+            result['compression_opts'] = conf['CompressionLevel']
+    if 'Shuffle' in conf:
+        result['shuffle'] = conf['Shuffle']
+    if len(set(result) - {'dtype'}) > 0 and 'chunks' not in result:
+        result['chunks'] = True
+    return result
+
+def storage_options_like(dset, leading_shape=()):
+    """h5py create_dataset() keyword arguments that reproduce the
+    layout, filters and dtype of dset, optionally with extra leading
+    dimensions (chunked one entry at a time)."""
+    result = {'dtype': dset.dtype}
+    if dset.chunks is not None:
+        result['chunks'] = (1,)*len(leading_shape) + dset.chunks
+    if dset.compression is not None:
+        result['compression'] = dset.compression
+        result['compression_opts'] = dset.compression_opts
+    if dset.shuffle:
+        result['shuffle'] = True
+    return result
+
+def create_dataset(parent, name, data, storage=None, dtype=None):
+    """Create dataset using 'Storage' options.  dtype is the default
+    precision if none is configured."""
+    data = np.asarray(data)
+    kwargs = storage_options(storage, data.shape)
+    if dtype is not None:
+        kwargs.setdefault('dtype', dtype)
+    return parent.create_dataset(name, data=data, **kwargs)
+
+def default_cache_dir():
+    """Cache directory from $PBPL_GEANT4_CACHE (default
+    ~/.cache/pbpl-geant4)."""
+    return os.environ.get(
+        'PBPL_GEANT4_CACHE',
+        os.path.join(os.path.expanduser('~'), '.cache', 'pbpl-geant4'))
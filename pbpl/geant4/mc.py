@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 import os, sys, random
+import json
+import hashlib
+import fcntl
 import argparse
 import asteval
 import numpy as np
@@ -15,8 +18,6 @@ from importlib import import_module
 from collections import namedtuple
 from treelib import Node, Tree
 
-kludge = 0.0
-
 def get_parser():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -105,19 +106,6 @@ class StatusEventAction(g4.G4UserEventAction):
             self.prev_time = curr_time
         self.count += 1
 
-class MyStackingAction(g4.G4UserStackingAction):
-    "My Stacking Action"
-
-    def ClassifyNewTrack(self, track):
-        print('ClassifyNewTrack')
-        return track
-
-    def NewStage(self):
-        print('NewStage')
-
-    def PrepareNewEvent(self):
-        print('PrepareNewEvent')
-
 TrackingNode = namedtuple(
     'TrackingNode', ['particle', 'process', 'volume', 'energy'])
 
@@ -169,24 +157,28 @@ def G4ThreeVector_to_list(x):
     return [x.getX(), x.getY(), x.getZ()]
 
 class SimpleDepositionSD(g4.G4VSensitiveDetector):
-    def __init__(self, name, filename):
+    def __init__(self, name, filename, storage=None):
         g4.G4VSensitiveDetector.__init__(self, name)
         self.filename = filename
+        self.storage = storage
         self.position = []
         self.edep = []
 
     def ProcessHits(self, step, history):
         self.position.append(
             G4ThreeVector_to_list(step.GetPreStepPoint().GetPosition()))
-        self.edep.append(step.GetTotalEnergyDeposit())
+        self.edep.append(
+            step.GetTotalEnergyDeposit() * step.GetTrack().GetWeight())
 
     def finalize(self, num_events):
         path = os.path.dirname(self.filename)
         if path != '':
             os.makedirs(path, exist_ok=True)
         f = h5py.File(self.filename, 'w')
-        f['position'] = np.array(self.position)/mm
-        f['edep'] = np.array(self.edep)/keV
+        geant4.create_dataset(
+            f, 'position', np.array(self.position)/mm, self.storage)
+        geant4.create_dataset(
+            f, 'edep', np.array(self.edep)/keV, self.storage)
         f['edep'].attrs.create('num_events', num_events)
         f.close()
 
@@ -213,6 +205,7 @@ class BinnedDepositionSD(g4.G4VSensitiveDetector):
             self.groupname = conf['Group']
         else:
             self.groupname = None
+        self.storage = conf.get('Storage')
         if 'Transformation' in conf:
             self.M = geant4.build_transformation(
                 conf['Transformation'], mm, deg)
@@ -222,8 +215,13 @@ class BinnedDepositionSD(g4.G4VSensitiveDetector):
         for q in g4.hepunit.__dict__:
             aeval.symtable[q] = g4.hepunit.__dict__[q]
         self.bin_edges = [aeval(q) for q in conf['BinEdges']]
-        self.hist = np.zeros([len(q)-1 for q in self.bin_edges])
-        self.update_interval = self.hist.size
+        self.sparse = conf.get('Sparse', False)
+        if self.sparse:
+            self.hist = geant4.sparse.SparseHistogram(self.bin_edges)
+            self.update_interval = conf.get('UpdateInterval', 100000)
+        else:
+            self.hist = np.zeros([len(q)-1 for q in self.bin_edges])
+            self.update_interval = self.hist.size
         self.position = []
         self.edep = []
         try:
@@ -276,9 +274,10 @@ class BinnedDepositionSD(g4.G4VSensitiveDetector):
                 return
             elif mode == 'Include' and match == False:
                 return
+        # track weight (importance biasing) keeps tallies unbiased
         self.position.append(
             G4ThreeVector_to_list(step.GetPreStepPoint().GetPosition()))
-        self.edep.append(step.GetTotalEnergyDeposit())
+        self.edep.append(step.GetTotalEnergyDeposit() * track.GetWeight())
         if len(self.edep) > self.update_interval:
             self.update_histo()
         return
@@ -286,9 +285,12 @@ class BinnedDepositionSD(g4.G4VSensitiveDetector):
     def update_histo(self):
         if len(self.position)>0:
             M_position = geant4.transform(self.M, np.array(self.position))
-            B, _ = np.histogramdd(
-                M_position, self.bin_edges, weights=np.array(self.edep))
-            self.hist += B
+            if self.sparse:
+                self.hist.fill(M_position, np.array(self.edep))
+            else:
+                B, _ = np.histogramdd(
+                    M_position, self.bin_edges, weights=np.array(self.edep))
+                self.hist += B
             self.position = []
             self.edep = []
 
@@ -302,9 +304,17 @@ class BinnedDepositionSD(g4.G4VSensitiveDetector):
             gout = fout.create_group(self.groupname)
         else:
             gout = fout
-        gout['edep'] = self.hist.astype('float32')/MeV
-        gout['edep'].attrs.create('num_events', num_events)
-        gout['edep'].attrs.create('unit', np.string_('MeV'))
+        if self.sparse:
+            geant4.sparse.write_coo(
+                gout, 'edep', self.hist.index, self.hist.value/MeV,
+                self.hist.shape, num_events, 'MeV',
+                **geant4.storage_options(
+                    self.storage, self.hist.index.shape))
+        else:
+            geant4.create_dataset(
+                gout, 'edep', self.hist/MeV, self.storage, 'float32')
+            gout['edep'].attrs.create('num_events', num_events)
+            gout['edep'].attrs.create('unit', np.string_('MeV'))
         for i, dset_name in enumerate(['xbin', 'ybin', 'zbin']):
             gout[dset_name] = self.bin_edges[i]/mm
             gout[dset_name].attrs.create('unit', np.string_('mm'))
@@ -327,12 +337,16 @@ class SpectralDepositionSD(g4.G4VSensitiveDetector):
             self.groupname = conf['Group']
         else:
             self.groupname = None
+        self.storage = conf.get('Storage')
         aeval = asteval.Interpreter(use_numpy=True)
         for q in g4.hepunit.__dict__:
             aeval.symtable[q] = g4.hepunit.__dict__[q]
         self.bin_edges = aeval(conf['BinEdges'])
+        # arrays (ArrayCount) get one histogram per copy
+        self.num_copies = {k:geom_copies.get(k, 1) for k in self.volumes}
         self.hist = {
-            k:np.zeros(len(self.bin_edges)-1) for k in self.volumes}
+            k:np.zeros((self.num_copies[k], len(self.bin_edges)-1))
+            for k in self.volumes}
         self.hits = {k:[] for k in self.volumes}
         self.update_interval = 1000  #len(self.bin_edges)
         try:
@@ -359,8 +373,12 @@ class SpectralDepositionSD(g4.G4VSensitiveDetector):
             elif mode == 'Include' and match == False:
                 return
         volume = str(track.GetVolume().GetName())
+        if self.num_copies[volume] > 1:
+            copy = step.GetPreStepPoint().GetTouchable().GetReplicaNumber(0)
+        else:
+            copy = 0
         hits = self.hits[volume]
-        hits.append(step.GetTotalEnergyDeposit())
+        hits.append((copy, step.GetTotalEnergyDeposit(), track.GetWeight()))
         if len(hits) > self.update_interval:
             self.update_histo(volume)
         return
@@ -368,7 +386,11 @@ class SpectralDepositionSD(g4.G4VSensitiveDetector):
     def update_histo(self, volume):
         hits = self.hits[volume]
         if len(hits)>0:
-            hist, _ = np.histogram(hits, self.bin_edges)
+            copy, edep, weight = np.array(hits).T
+            hist, _, _ = np.histogram2d(
+                copy, edep,
+                (np.arange(self.num_copies[volume]+1), self.bin_edges),
+                weights=weight)
             self.hist[volume] += hist
             self.hits[volume] = []
 
@@ -382,18 +404,29 @@ class SpectralDepositionSD(g4.G4VSensitiveDetector):
         else:
             gout = fout
         hits = []
+        detector_bin = []
+        detector_copy = []
         for volume in self.volumes:
             self.update_histo(volume)
             # gout[volume] = self.hist[volume]
-            hits.append(self.hist[volume])
+            hits.extend(self.hist[volume])
+            name = volume.split('.', 1)[1]
+            if self.num_copies[volume] > 1:
+                for i in range(self.num_copies[volume]):
+                    detector_bin.append('{}[{}]'.format(name, i))
+                    detector_copy.append(i)
+            else:
+                detector_bin.append(name)
+                detector_copy.append(0)
         hits = np.array(hits)
-        gout['hits'] = hits.astype('float32')
+        geant4.create_dataset(gout, 'hits', hits, self.storage, 'float32')
         gout['hits'].attrs.create('num_events', num_events)
         gout['hits'].attrs.create('unit', np.string_('count'))
         gout['detector_bin'] = [
-            p.split('.', 1)[1].encode('ascii', 'ignore') for p in self.volumes]
-        np.arange(len(self.volumes))
+            p.encode('ascii', 'ignore') for p in detector_bin]
         gout['detector_bin'].attrs.create('unit', np.string_('name'))
+        gout['detector_copy'] = np.array(detector_copy, dtype=np.int32)
+        gout['detector_copy'].attrs.create('unit', np.string_('copy'))
         gout['photon_bin'] = self.bin_edges/MeV
         gout['photon_bin'].attrs.create('unit', np.string_('MeV'))
         # gout['BinEdges'] = self.bin_edges/MeV
@@ -403,15 +436,17 @@ class SpectralDepositionSD(g4.G4VSensitiveDetector):
 
 
 TransmissionResult = namedtuple(
-    'TransmissionResult', ['position', 'direction', 'energy', 'time'])
+    'TransmissionResult',
+    ['position', 'direction', 'energy', 'time', 'weight'])
 
 class TransmissionSD(g4.G4VSensitiveDetector):
-    def __init__(self, name, filename, particles):
+    def __init__(self, name, filename, particles, storage=None):
         g4.G4VSensitiveDetector.__init__(self, name)
         self.filename = filename
         self.particles = particles
+        self.storage = storage
         self.results = {
-            p:TransmissionResult([], [], [], []) for p in particles }
+            p:TransmissionResult([], [], [], [], []) for p in particles }
 
     def ProcessHits(self, step, history):
         proc = step.GetPostStepPoint().GetProcessDefinedStep()
@@ -430,6 +465,7 @@ class TransmissionSD(g4.G4VSensitiveDetector):
                     G4ThreeVector_to_list(point.GetMomentumDirection()))
                 result.energy.append(point.GetKineticEnergy())
                 result.time.append(point.GetGlobalTime())
+                result.weight.append(point.GetWeight())
 
     def finalize(self, num_events):
         path = os.path.dirname(self.filename)
@@ -438,10 +474,13 @@ class TransmissionSD(g4.G4VSensitiveDetector):
         fout = h5py.File(self.filename, 'w')
         for p, result in self.results.items():
             gout = fout.create_group(p)
-            gout['position'] = np.array(result.position)/mm
-            gout['direction'] = np.array(result.direction)
-            gout['energy'] = np.array(result.energy)/MeV
-            gout['time'] = np.array(result.time)/ns
+            for dset_name, A in [
+                    ('position', np.array(result.position)/mm),
+                    ('direction', np.array(result.direction)),
+                    ('energy', np.array(result.energy)/MeV),
+                    ('time', np.array(result.time)/ns),
+                    ('weight', np.array(result.weight))]:
+                geant4.create_dataset(gout, dset_name, A, self.storage)
         fout['num_events'] = num_events
         fout.close()
 
@@ -509,10 +548,18 @@ class MyGeometry(g4.G4VUserDetectorConstruction):
             raise ValueError('Must define exactly one top-level Geometry')
         world_name = geometry_keys[0]
 
-        global geom_s, geom_l, geom_p
+        global geom_s, geom_l, geom_p, geom_members
         geom_s = {}
         geom_l = {}
         geom_p = {}
+        # logical volumes that make up a geometry (e.g., tetrahedra of
+        # a tetrahedral CadMesh) when other than geom_l[name]
+        geom_members = {}
+        global geom_meshes
+        geom_meshes = {}
+        # number of copies of arrays (ArrayCount)
+        global geom_copies
+        geom_copies = {}
 
         for geom in depth_first_tree_traversal(self.conf['Geometry']):
             geom_type = geom['Type']
@@ -522,6 +569,9 @@ class MyGeometry(g4.G4VUserDetectorConstruction):
                 parent_p = geom_p[parent_name]
             else:
                 parent_p = None
+            material = g4.gNistManager.FindOrBuildMaterial(geom['Material'])
+            logical = None
+            mesh_offset = None
 
             if geom_type == 'G4Box':
                 solid = g4.G4Box(
@@ -531,23 +581,34 @@ class MyGeometry(g4.G4VUserDetectorConstruction):
                     geom_name, geom['pRMin']*mm, geom['pRMax']*mm,
                     geom['pDz']*mm, geom['pSPhi']*deg, geom['pDPhi']*deg)
             elif geom_type == 'CadMesh':
-                mesh = geant4.cadmesh.TessellatedMesh(geom['File'])
-                    # geom['File'], geant4.cadmesh.Type.STL)
-                if 'SolidName' in geom:
-                    solid = mesh.GetSolid(geom['SolidName'])
-                    # solid = mesh.GetSolid(geom['SolidName'], True)
+                navigation = geom.get('Navigation', 'tessellated')
+                if navigation == 'tessellated':
+                    solid = geant4.meshcache.load_mesh_solid(
+                        geom['File'], geom.get('SolidName'),
+                        None if geom.get('Cache', True) else False,
+                        geom.get('Voxels', 0))
+                elif navigation == 'tetrahedral':
+                    if parent_p is None:
+                        raise ValueError(
+                            'tetrahedral CadMesh cannot be the world')
+                    tet = geant4.cadmesh.TetrahedralVolume(
+                        geom['File'], geom_name, material,
+                        geom_l[parent_name].GetMaterial(),
+                        geom.get('Quality', 0.0))
+                    logical = tet.getEnvelope()
+                    solid = logical.GetSolid()
+                    mesh_offset = tet.getCenter()
+                    geom_members[geom_name] = tet.getVolumes()
+                    geom_meshes[geom_name] = tet
                 else:
-                    solid = mesh.GetSolid(0)
+                    raise ValueError(
+                        "unknown CadMesh Navigation '{}'".format(navigation))
             else:
                 raise ValueError(
                     "unimplemented geometry type '{}'".format(geom_type))
 
-            logical = g4.G4LogicalVolume(
-                solid, g4.gNistManager.FindOrBuildMaterial(
-                    geom['Material']), geom_name)
-            if 'Baka' in geom:
-                global kludge
-                kludge = logical
+            if logical is None:
+                logical = g4.G4LogicalVolume(solid, material, geom_name)
             transform = g4.G4Transform3D()
             if 'Transformation' in geom:
                 for operation, value in zip(*geom['Transformation']):
@@ -582,69 +643,261 @@ class MyGeometry(g4.G4VUserDetectorConstruction):
                     *np.array(geom['Translation'])*mm)
             else:
                 translation = g4.G4ThreeVector()
-            physical = g4.G4PVPlacement(
-                g4.G4Transform3D(rotation, translation) * transform,
-                geom_name, logical, parent_p, many, 0, check_overlap)
+            if mesh_offset is not None:
+                transform = transform * g4.G4Transform3D(
+                    g4.G4RotationMatrix(), mesh_offset)
+            transform = g4.G4Transform3D(rotation, translation) * transform
+            if 'ArrayCount' in geom:
+                if parent_p is None:
+                    raise ValueError('array cannot be the world')
+                count = [int(x) for x in geom['ArrayCount']]
+                physical = geant4.placeArray(
+                    geom_name, logical, geom_l[parent_name], *count,
+                    g4.G4ThreeVector(*np.array(geom['ArrayPitch'])*mm),
+                    transform)
+                geom_copies[geom_name] = int(np.prod(count))
+            else:
+                physical = g4.G4PVPlacement(
+                    transform, geom_name, logical, parent_p, many, 0,
+                    check_overlap)
 
-            if 'Visible' in geom and not geom['Visible']:
+            if geom_name in geom_members:
                 logical.SetVisAttributes(g4.G4VisAttributes(False))
-            elif 'Color' in geom:
-                logical.SetVisAttributes(
-                    g4.G4VisAttributes(g4.G4Color(*geom['Color'])))
+            for x in geom_members.get(geom_name, [logical]):
+                if 'Visible' in geom and not geom['Visible']:
+                    x.SetVisAttributes(g4.G4VisAttributes(False))
+                elif 'Color' in geom:
+                    x.SetVisAttributes(
+                        g4.G4VisAttributes(g4.G4Color(*geom['Color'])))
 
             geom_s[geom_name] = solid
             geom_l[geom_name] = logical
             geom_p[geom_name] = physical
 
+        global regions
+        regions = create_regions(self.conf)
+
         return geom_p[world_name]
 
     def ConstructSDandField(self):
         sys.exit()
         pass
 
+# TOML keys of a Fields table that override the FieldSettings of its
+# Preset (lengths in mm)
+field_setting_keys = {
+    'Stepper': ('stepper', None),
+    'MinimumStep': ('min_step', mm),
+    'DeltaChord': ('delta_chord', mm),
+    'DeltaOneStep': ('delta_one_step', mm),
+    'DeltaIntersection': ('delta_intersection', mm),
+    'MinimumEpsilonStep': ('min_epsilon_step', None),
+    'MaximumEpsilonStep': ('max_epsilon_step', None) }
+
+def get_field_settings(c):
+    result = geant4.fieldPreset(c.get('Preset', 'default'))
+    for key, (attr, unit) in field_setting_keys.items():
+        if key in c:
+            setattr(result, attr, c[key] if unit is None else c[key]*unit)
+    return result
+
 def create_fields(conf):
+    """Create fields and their field managers.
+
+    A field applies to the logical volumes listed in ``Volumes`` (and
+    their daughters unless ``ApplyToDaughters`` is false) through a
+    local G4FieldManager, so tracks elsewhere use straight-line
+    transport.  Without ``Volumes``, the field is attached to the
+    global field manager and fills the whole world.
+    """
     result = {}
 
     if 'Fields' not in conf:
         return result
 
+    global field_managers
+    field_managers = {}
+
     for name in (conf['Fields']):
         c = conf['Fields'][name]
         field_type = c['Type']
         if field_type == 'ImportedMagneticField':
             field = geant4.ImportedMagneticField(c['File'])
-            field_manager = g4.gTransportationManager.GetFieldManager()
-            field_manager.SetDetectorField(field)
-            field_manager.CreateChordFinder(field)
-            chord_finder = field_manager.GetChordFinder()
-            # field_manager.SetMaximumEpsilonStep(0.001)
-            if 'MinimumEpsilonStep' in c:
-                field_manager.SetMinimumEpsilonStep(c['MinimumEpsilonStep'])
-            if 'MaximumEpsilonStep' in c:
-                field_manager.SetMaximumEpsilonStep(c['MaximumEpsilonStep'])
-            # field_manager.SetDeltaOneStep(1*mm)
-            # field_manager.SetDeltaIntersection(0.001*mm)
-            if 'DeltaChord' in c:
-                chord_finder.SetDeltaChord(c['DeltaChord']*mm)
             if 'ScalingFactor' in c:
                 field.setScalingFactor(c['ScalingFactor'])
+            if 'Interpolation' in c:
+                field.setInterpolation(c['Interpolation'])
         elif field_type == 'UniformMagneticField':
             field = g4.G4UniformMagField(
-                # g4.G4ThreeVector(0.22*tesla, 0.0, 0.0))
-                g4.G4ThreeVector(0.44*tesla, 0.0, 0.0))
-#            field_manager = g4.gTransportationManager.GetFieldManager()
-            field_manager = g4.G4FieldManager()
-            field_manager.SetDetectorField(field)
-            field_manager.CreateChordFinder(field)
-            chord_finder = field_manager.GetChordFinder()
-            global kludge
-            kludge.SetFieldManager(field_manager, True)
+                g4.G4ThreeVector(*np.array(c['Value'])*tesla))
         else:
             raise ValueError(
                 "unimplemented Field type '{}'".format(field_type))
+        if 'Volumes' in c:
+            field_manager = g4.G4FieldManager()
+            for volume in c['Volumes']:
+                geom_l[volume].SetFieldManager(
+                    field_manager, c.get('ApplyToDaughters', True))
+        else:
+            field_manager = g4.gTransportationManager.GetFieldManager()
+        geant4.configureFieldManager(
+            field_manager, field, get_field_settings(c))
+        field_managers[name] = field_manager
         result[name] = field
     return result
 
+def create_regions(conf):
+    """Create G4Regions with their own production cuts.
+
+    .. code-block:: toml
+
+      [Regions.Shield]
+      Volumes = ['World.Shield']
+      Cuts = 10.0                  # mm, all particles
+      [Regions.Sensor]
+      Volumes = ['World.Box.Sensor']
+      Cuts = { gamma = 0.1, e- = 0.01 }
+      DefaultCut = 1.0             # particles not in Cuts (mm,
+                                   # default PhysicsList.DefaultCut)
+    """
+    result = {}
+
+    if 'Regions' not in conf:
+        return result
+
+    for name in (conf['Regions']):
+        c = conf['Regions'][name]
+        cuts = c.get('Cuts', {})
+        default_cut = c.get(
+            'DefaultCut', conf.get('PhysicsList', {}).get('DefaultCut', 1.0))*mm
+        if isinstance(cuts, dict):
+            cuts = {k:v*mm for k, v in cuts.items()}
+        else:
+            default_cut = cuts*mm
+            cuts = {}
+        result[name] = geant4.createRegion(
+            name, [geom_l[x] for x in c['Volumes']], cuts, default_cut)
+    return result
+
+# material properties that require optical physics
+optical_properties = set([
+    'RINDEX', 'ABSLENGTH', 'RAYLEIGH', 'MIEHG', 'WLSABSLENGTH',
+    'WLSCOMPONENT', 'SCINTILLATIONYIELD', 'FASTCOMPONENT',
+    'SLOWCOMPONENT', 'REFLECTIVITY', 'EFFICIENCY'])
+
+def uses_optical_physics(conf):
+    for c in conf.get('Materials', {}).values():
+        if optical_properties & set(c.get('Properties', {})):
+            return True
+    return False
+
+def create_physics_list(conf):
+    """Build PhysicsList from the PhysicsList table.
+
+    .. code-block:: toml
+
+      [PhysicsList]
+      EM = 'G4EmStandardPhysics_option4'  # default 'PhysicsListEMstd'
+      Optical = 'auto'       # true, false or 'auto' (default): only if
+                             # Materials define optical properties
+      Constructors = ['G4DecayPhysics']
+      DefaultCut = 1.0       # mm
+    """
+    c = conf.get('PhysicsList', {})
+    result = geant4.PhysicsList()
+    if 'EM' in c:
+        result.registerConstructor(c['EM'])
+    optical = c.get('Optical', 'auto')
+    if optical == 'auto':
+        optical = uses_optical_physics(conf)
+    if optical:
+        result.registerConstructor('G4OpticalPhysics')
+    for name in c.get('Constructors', []):
+        result.registerConstructor(name)
+    if 'DefaultCut' in c:
+        result.SetDefaultCutValue(c['DefaultCut']*mm)
+    for particle in conf.get('ImportanceBiasing', {}).get('Particles', []):
+        result.registerImportanceBiasing(particle)
+    return result
+
+def create_importances(conf):
+    """Set geometry cell importances for ImportanceBiasing.
+
+    .. code-block:: toml
+
+      [ImportanceBiasing]
+      Particles = ['neutron', 'gamma']
+
+      [Geometry.World.Shield.Layer2]
+      Importance = 4    # default: importance of mother (world: 1)
+
+    Tracks are split entering cells of higher importance and played
+    Russian roulette entering cells of lower importance.
+    """
+    if len(conf.get('ImportanceBiasing', {}).get('Particles', [])) == 0:
+        return
+    for geom in depth_first_tree_traversal(conf['Geometry']):
+        name = geom['Name']
+        if '.' not in name:
+            geant4.setImportance(geom_p[name], geom.get('Importance', 1.0))
+        elif 'Importance' in geom:
+            geant4.setImportance(geom_p[name], geom['Importance'])
+
+def physics_table_key(conf, macro_filenames=()):
+    """Hash of everything physics tables depend on: physics list,
+    materials, regions (cuts), materials used by geometry, Geant4 and
+    data set versions ($G4...DATA paths) and the contents of macros
+    run before the tables are built (e.g., /run/setCut)."""
+    geometry_materials = sorted(set(
+        geom['Material']
+        for geom in depth_first_tree_traversal(conf['Geometry'])))
+    data_sets = {
+        k:os.path.realpath(v) for k, v in os.environ.items()
+        if k.startswith('G4') and k.endswith('DATA') }
+    macros = []
+    for filename in macro_filenames:
+        with open(filename) as f:
+            macros.append(f.read())
+    spec = {
+        'G4Version': str(g4.gRunManager.GetVersionString()),
+        'DataSets': data_sets,
+        'Macros': macros,
+        'PhysicsList': conf.get('PhysicsList', {}),
+        'Optical': uses_optical_physics(conf),
+        'Materials': conf.get('Materials', {}),
+        'Regions': conf.get('Regions', {}),
+        'ImportanceBiasing': conf.get('ImportanceBiasing', {}),
+        'GeometryMaterials': geometry_materials }
+    return hashlib.sha1(
+        json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()
+
+def prepare_physics_tables(conf, macro_filenames=()):
+    """Retrieve physics tables from cache, or build and store them.
+
+    Tables are cached in default_cache_dir()/physics/KEY (see
+    physics_table_key()).  A lock file makes concurrent workers wait
+    for the first one to store the tables instead of building them
+    too.  Disabled by PhysicsList.TableCache = false.
+    """
+    if not conf.get('PhysicsList', {}).get('TableCache', True):
+        return
+    cache_dir = os.path.join(geant4.default_cache_dir(), 'physics')
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(
+        cache_dir, physics_table_key(conf, macro_filenames))
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.isdir(path):
+            g4.gApplyUICommand(
+                '/run/particle/retrievePhysicsTable ' + path)
+            return
+        # empty run builds the tables
+        g4.gRunManager.BeamOn(0)
+        tmp_path = path + '.{}.tmp'.format(os.getpid())
+        g4.gApplyUICommand('/run/particle/storePhysicsTable ' + tmp_path)
+        if os.path.isdir(tmp_path):
+            os.rename(tmp_path, path)
+
 def create_materials(conf):
     result = {}
 
@@ -691,7 +944,6 @@ def create_materials(conf):
 
 
 def create_detectors(conf):
-    global geom_l
     result = {}
 
     if 'Detectors' not in conf:
@@ -704,13 +956,15 @@ def create_detectors(conf):
         c = conf['Detectors'][name]
         sd_type = c['Type']
         if sd_type == 'SimpleDepositionSD':
-            sd = SimpleDepositionSD('pbpl/' + name, c['File'])
+            sd = SimpleDepositionSD(
+                'pbpl/' + name, c['File'], c.get('Storage'))
         elif sd_type == 'BinnedDepositionSD':
             sd = BinnedDepositionSD('pbpl/' + name, c)
         elif sd_type == 'SpectralDepositionSD':
             sd = SpectralDepositionSD('pbpl/' + name, c)
         elif sd_type == 'TransmissionSD':
-            sd = TransmissionSD('pbpl/' + name, c['File'], c['Particles'])
+            sd = TransmissionSD(
+                'pbpl/' + name, c['File'], c['Particles'], c.get('Storage'))
         elif sd_type == 'FlagSD':
             sd = FlagSD('pbpl/' + name, c)
         else:
@@ -719,12 +973,70 @@ def create_detectors(conf):
         for volume in c['Volumes']:
             if volume not in multi_sd:
                 msd = geant4.G4MultiSensitiveDetector('pbpl/' + volume)
-                geom_l[volume].SetSensitiveDetector(msd)
+                for logical in geom_members.get(volume, [geom_l[volume]]):
+                    logical.SetSensitiveDetector(msd)
                 multi_sd[volume] = msd
             multi_sd[volume].AddSD(sd)
         result[name] = sd
     return result
 
+def create_stacking_action(conf):
+    if 'StackingAction' not in conf:
+        return None
+    c = conf['StackingAction']
+    result = geant4.StackingAction()
+    for particle, energy in c.get('Thresholds', {}).items():
+        result.setThreshold(particle, energy*MeV)
+    for particle, stage in c.get('Stages', {}).items():
+        result.setStage(particle, stage)
+    if 'RegionOfInterest' in c:
+        vol = np.array(c['RegionOfInterest'])*mm
+        result.setRegionOfInterest(
+            g4.G4ThreeVector(*vol[:,0]), g4.G4ThreeVector(*vol[:,1]))
+    if 'MaxGeneration' in c:
+        result.setMaxGeneration(c['MaxGeneration'])
+    return result
+
+def write_stacking_summary(conf, action, num_events):
+    """Write kill counts and killed kinetic energy (particle x reason),
+    both summed over track weights.  Rows are the configured Particles plus 'other', so output of
+    parallel runs has a fixed shape and is summed when merged."""
+    c = conf['StackingAction']
+    if 'File' not in c:
+        return
+    particles = c.get(
+        'Particles',
+        sorted(set(['e-', 'e+', 'gamma']) | set(c.get('Thresholds', {}))))
+    reasons = action.killReasons()
+    killed = np.zeros((len(particles) + 1, len(reasons)))
+    killed_energy = np.zeros(killed.shape)
+    for p in action.getKilledParticles():
+        i = particles.index(p) if p in particles else len(particles)
+        killed[i] += action.getKillCounts(p)
+        killed_energy[i] += action.getKilledEnergy(p)
+
+    filename = c['File']
+    path = os.path.dirname(filename)
+    if path != '':
+        os.makedirs(path, exist_ok=True)
+    fout = h5py.File(filename, 'a')
+    if 'Group' in c:
+        gout = fout.create_group(c['Group'])
+    else:
+        gout = fout
+    gout['killed'] = killed
+    gout['killed'].attrs.create('num_events', num_events)
+    gout['killed'].attrs.create('unit', np.string_('count'))
+    gout['killed_energy'] = killed_energy/MeV
+    gout['killed_energy'].attrs.create('num_events', num_events)
+    gout['killed_energy'].attrs.create('unit', np.string_('MeV'))
+    gout['particle'] = [
+        p.encode('ascii', 'ignore') for p in particles + ['other']]
+    gout['particle'].attrs.create('unit', np.string_('name'))
+    gout['reason'] = [p.encode('ascii', 'ignore') for p in reasons]
+    gout['reason'].attrs.create('unit', np.string_('name'))
+    fout.close()
+
 def create_event_actions(conf):
     result = {}
 
@@ -757,7 +1069,7 @@ def main():
     g4.gRunManager.SetUserInitialization(detector)
 
     global physics_list
-    physics_list = geant4.PhysicsList()
+    physics_list = create_physics_list(args.conf)
     g4.gRunManager.SetUserInitialization(physics_list)
 
     global pga
@@ -777,9 +1089,10 @@ def main():
     for action in event_actions.values():
         g4.gRunManager.SetUserAction(action)
 
-    # global stacking_action
-    # stack_action = MyStackingAction()
-    # g4.gRunManager.SetUserAction(stack_action)
+    global stacking_action
+    stacking_action = create_stacking_action(args.conf)
+    if stacking_action is not None:
+        g4.gRunManager.SetUserAction(stacking_action)
 
     global tracking_action
     track_action = MyTrackingAction()
@@ -787,6 +1100,8 @@ def main():
 
     g4.gRunManager.Initialize()
 
+    create_importances(args.conf)
+
     global materials
     materials = create_materials(args.conf)
     # for mat in materials.values():
@@ -804,11 +1119,16 @@ def main():
         g4.gControlExecute(x)
 
     # g4.gApplyUICommand('/tracking/storeTrajectory 1')
+    prepare_physics_tables(args.conf, args.macro_filenames)
+
     g4.gRunManager.BeamOn(num_events)
 
     for k, sd in detectors.items():
         sd.finalize(num_events)
 
+    if stacking_action is not None:
+        write_stacking_summary(args.conf, stacking_action, num_events)
+
     return 0
 
 if __name__ == '__main__':
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import os
+import hashlib
+from tempfile import NamedTemporaryFile
+from . import boost
+from .core import default_cache_dir
+
+# Bump when the cache layout (see src/SolidCache.cpp) changes
+cache_version = b'PBPLMSH1'
+
+def cache_key(filename, solid_name):
+    h = hashlib.sha1(cache_version)
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    h.update(b'\0' + str(solid_name).encode('utf-8'))
+    return h.hexdigest()
+
+def load_mesh_solid(filename, solid_name=None, cache_dir=None, max_voxels=0):
+    """Return tessellated solid of CAD mesh file.
+
+    The facets are cached under cache_dir, keyed by the hash of the mesh
+    file and solid_name.  Later calls (including other processes) read
+    the cache instead of parsing the mesh.  cache_dir=False disables
+    caching.  max_voxels > 0 sets the voxel budget of the solid's
+    navigation voxelization.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(default_cache_dir(), 'cadmesh')
+    name = solid_name or os.path.basename(filename)
+    if cache_dir is not False:
+        path = os.path.join(
+            cache_dir, cache_key(filename, solid_name) + '.msh')
+        if os.path.exists(path):
+            return boost.cadmesh.readSolidCache(path, name, max_voxels)
+
+    mesh = boost.cadmesh.TessellatedMesh(filename)
+    if solid_name is not None:
+        solid = mesh.GetSolid(solid_name)
+    else:
+        solid = mesh.GetSolid(0)
+    if cache_dir is False and max_voxels <= 0:
+        return solid
+
+    # Write then rename, so concurrent workers never read partial
+    # files.  The solid is rebuilt from the cache, since voxelization
+    # is fixed once CADMesh closes its solid.
+    tmp_dir = cache_dir if cache_dir is not False else None
+    if tmp_dir is not None:
+        os.makedirs(tmp_dir, exist_ok=True)
+    with NamedTemporaryFile(dir=tmp_dir, suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+    try:
+        boost.cadmesh.writeSolidCache(solid, tmp_path)
+        if cache_dir is False:
+            return boost.cadmesh.readSolidCache(tmp_path, name, max_voxels)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    return boost.cadmesh.readSolidCache(path, name, max_voxels)
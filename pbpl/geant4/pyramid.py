@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import sys
+import argparse
+import numpy as np
+import h5py
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        description='Add multi-resolution pyramid to deposition file',
+        epilog='''\
+Example:
+
+.. code-block:: sh
+
+  pbpl-geant4-build-pyramid --group=Dump --levels=4 edep.h5
+
+Level L is stored as 'pyramid/L/edep' (plus 'xbin', 'ybin' and 'zbin')
+next to the full-resolution 'edep'.  Each level sums 2x2x2 blocks of
+the previous one.
+''')
+    parser.add_argument(
+        '--group', metavar='GROUP', default='/',
+        help="Group containing 'edep' (default='/')")
+    parser.add_argument(
+        '--levels', metavar='INT', type=int, default=None,
+        help='Number of coarsened levels (default=until one bin remains)')
+    parser.add_argument(
+        '--slab', metavar='INT', type=int, default=64,
+        help='Number of x bins coarsened at a time (default=64)')
+    parser.add_argument(
+        'filename', metavar='HDF5',
+        help='Deposition file (modified in place)')
+    return parser
+
+def get_args():
+    parser = get_parser()
+    args = parser.parse_args()
+    return args
+
+def coarsen_edges(edges):
+    if (len(edges)-1) % 2 == 0:
+        return edges[::2]
+    else:
+        return np.append(edges[::2], edges[-1])
+
+def coarsen(A, axes):
+    for axis in axes:
+        A = np.add.reduceat(A, np.arange(0, A.shape[axis], 2), axis=axis)
+    return A
+
+def pyramid_levels(gin):
+    """Sorted list of available pyramid levels (0 is full resolution)."""
+    if 'pyramid' not in gin:
+        return [0]
+    return [0] + sorted(int(k) for k in gin['pyramid'].keys())
+
+def get_level(gin, level):
+    """Return (edep, xbin, ybin, zbin) of given level.  edep is
+    returned as an unread h5py dataset."""
+    if level != 0:
+        gin = gin['pyramid/{}'.format(level)]
+    return (
+        gin['edep'], gin['xbin'][()], gin['ybin'][()], gin['zbin'][()])
+
+def select_level(gin, max_shape):
+    """Finest pyramid level with spatial shape no larger than max_shape."""
+    levels = pyramid_levels(gin)
+    for level in levels:
+        edep = get_level(gin, level)[0]
+        if all(n <= m for n, m in zip(edep.shape[-3:], max_shape)):
+            return level
+    return levels[-1]
+
+def build_pyramid(gout, num_levels=None, slab=64):
+    """Write 2x-coarsened copies of gout['edep'] to gout['pyramid/L'].
+
+    Each level is computed from the previous one, slab by slab along
+    x, so that memory use is bounded by one slab.
+    """
+    if not isinstance(gout['edep'], h5py.Dataset):
+        raise ValueError('pyramid requires dense edep dataset')
+    if 'pyramid' in gout:
+        del gout['pyramid']
+    slab += slab % 2
+    prev = gout
+    level = 0
+    while num_levels is None or level < num_levels:
+        edep = prev['edep']
+        bins_shape = edep.shape[-3:]
+        if all(n == 1 for n in bins_shape):
+            break
+        level += 1
+        runs_shape = edep.shape[:-3]
+        ax = len(runs_shape)
+        curr = gout.create_group('pyramid/{}'.format(level))
+        curr.attrs.create('factor', 2**level)
+        dset = curr.create_dataset(
+            'edep', shape=runs_shape + tuple((n+1)//2 for n in bins_shape),
+            dtype=edep.dtype, chunks=(edep.chunks is not None) or None,
+            compression=edep.compression,
+            compression_opts=edep.compression_opts, shuffle=edep.shuffle)
+        for k, v in edep.attrs.items():
+            dset.attrs[k] = v
+        for i0 in range(0, bins_shape[0], slab):
+            i1 = min(i0 + slab, bins_shape[0])
+            A = edep[(Ellipsis, slice(i0, i1), slice(None), slice(None))]
+            dset[(Ellipsis, slice(i0//2, (i1+1)//2),
+                  slice(None), slice(None))] = coarsen(
+                      A, [ax, ax+1, ax+2])
+        for dset_name in ['xbin', 'ybin', 'zbin']:
+            curr[dset_name] = coarsen_edges(prev[dset_name][()])
+            for k, v in prev[dset_name].attrs.items():
+                curr[dset_name].attrs[k] = v
+        prev = curr
+
+def main():
+    args = get_args()
+    with h5py.File(args.filename, 'a') as fout:
+        build_pyramid(fout[args.group], args.levels, args.slab)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
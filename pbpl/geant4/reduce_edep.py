@@ -5,21 +5,13 @@ import argparse
 import numpy as np
 import toml
 import tqdm
-import pbpl.geant4 as geant4
 from pbpl import geant4
-import Geant4 as g4
 from Geant4.hepunit import *
 import h5py
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plot
-import matplotlib as mpl
-from matplotlib.backends.backend_pdf import PdfPages
 from collections import namedtuple
 import itertools
 from functools import reduce
 import operator
-from scipy.spatial.transform import Rotation
 
 def get_parser():
     parser = argparse.ArgumentParser(
@@ -131,6 +123,9 @@ def main():
         gout[dset_name] = np.array(indices[i].vals/mm)
         gout[dset_name].attrs.create('unit', np.string_('mm'))
 
+    if 'PyramidLevels' in conf['Output']:
+        geant4.pyramid.build_pyramid(gout, conf['Output']['PyramidLevels'])
+
     return 0
 
 if __name__ == '__main__':
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import h5py
+from collections import namedtuple
+from . import pyramid
+
+ScanIndex = namedtuple('ScanIndex', 'label unit vals')
+
+def decode(x):
+    if isinstance(x, bytes):
+        return x.decode('utf-8')
+    return str(x)
+
+class ScanReader:
+    """Lazy reader for RunMonteCarlo and reduce-edep outputs.
+
+    Scan axes are read from the 'i0', 'i1', ... datasets (with 'label'
+    and 'unit' attributes) and deposition data is shaped
+    runs_shape + bins.  Nothing else is read until select() is called,
+    which reads only the requested hyperslab.  Contiguous, unfiltered
+    datasets are accessed through a read-only np.memmap instead.
+
+    .. code-block:: python
+
+      with ScanReader('scan.h5', 'Dump') as scan:
+          A = scan.select(energy=2.0, x=(-1.0, 1.0))
+    """
+    def __init__(self, filename, group='/', use_mmap=True):
+        self.filename = filename
+        self.use_mmap = use_mmap
+        self.fin = h5py.File(filename, 'r')
+        self.group = self.fin[group]
+        if 'i0' in self.group:
+            gindex = self.group
+        else:
+            gindex = self.fin
+        self.indices = []
+        while 'i{}'.format(len(self.indices)) in gindex:
+            dset = gindex['i{}'.format(len(self.indices))]
+            vals = dset[()]
+            if vals.dtype.kind == 'S':
+                vals = np.array([decode(x) for x in vals])
+            self.indices.append(ScanIndex(
+                decode(dset.attrs.get('label', '')),
+                decode(dset.attrs.get('unit', 'None')), vals))
+        self.labels = [x.label for x in self.indices]
+        # leading (scan) dimensions of the data
+        if 'num_events' in self.fin:
+            self.runs_shape = self.fin['num_events'].shape
+        elif isinstance(self.group.get('edep'), h5py.Dataset):
+            self.runs_shape = self.group['edep'].shape[:len(self.indices)]
+        else:
+            self.runs_shape = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.fin.close()
+
+    @property
+    def num_events(self):
+        return self.fin['num_events'][()]
+
+    def dataset(self, name='edep', level=0):
+        """Return np.memmap if possible, otherwise the h5py dataset."""
+        if name == 'edep':
+            dset = pyramid.get_level(self.group, level)[0]
+        else:
+            dset = self.group[name]
+        if self.use_mmap and dset.chunks is None and not dset.is_virtual:
+            offset = dset.id.get_offset()
+            if offset is not None:
+                return np.memmap(
+                    self.filename, dtype=dset.dtype, mode='r',
+                    offset=offset, shape=dset.shape)
+        return dset
+
+    def bins(self, axis, level=0):
+        """Bin edges along 'x', 'y' or 'z'."""
+        _, xbin, ybin, zbin = pyramid.get_level(self.group, level)
+        return {'x': xbin, 'y': ybin, 'z': zbin}[axis]
+
+    def scan_index(self, label, value):
+        """Index of value in scan axis.  Binned axes (n+1 edges for n
+        runs) select the bin containing value, other numerical axes
+        select the nearest value."""
+        i = self.labels.index(label)
+        vals = self.indices[i].vals
+        if vals.dtype.kind in 'US':
+            return list(vals).index(value)
+        if vals.ndim == 2:
+            vals = vals.mean(axis=1)
+        if (self.runs_shape is not None and vals.ndim == 1 and
+            len(self.runs_shape) > i and
+            len(vals) == self.runs_shape[i] + 1):
+            n = self.runs_shape[i]
+            j = np.searchsorted(vals, value, side='right') - 1
+            return int(np.clip(j, 0, n-1))
+        return int(np.abs(vals - value).argmin())
+
+    def bin_slice(self, axis, lower, upper, level=0):
+        """Slice of bins along axis overlapping [lower, upper].  A
+        degenerate range (lower == upper) selects the bin containing
+        it.  Raises ValueError if the range lies outside the axis."""
+        edges = self.bins(axis, level)
+        if upper < edges[0] or lower > edges[-1]:
+            raise ValueError(
+                "[{}, {}] is outside {} axis [{}, {}]".format(
+                    lower, upper, axis, edges[0], edges[-1]))
+        i0 = np.clip(
+            np.searchsorted(edges, lower, side='right') - 1, 0, len(edges)-2)
+        i1 = min(np.searchsorted(edges, upper, side='left'), len(edges)-1)
+        return slice(int(i0), int(max(i1, i0+1)))
+
+    def select(self, name='edep', level=0, **kwargs):
+        """Read hyperslab of dataset.
+
+        Keyword arguments are scan labels or 'x', 'y', 'z'.  A scalar
+        value selects a single index (dimension is dropped), a
+        (lower, upper) pair selects a range, and missing keys select
+        everything.
+        """
+        dset = self.dataset(name, level)
+        sel = []
+        for index in self.indices:
+            if index.label not in kwargs:
+                sel.append(slice(None))
+                continue
+            val = kwargs.pop(index.label)
+            if isinstance(val, tuple):
+                sel.append(slice(
+                    self.scan_index(index.label, val[0]),
+                    self.scan_index(index.label, val[1]) + 1))
+            else:
+                sel.append(self.scan_index(index.label, val))
+        for axis in ['x', 'y', 'z']:
+            if axis not in kwargs:
+                sel.append(slice(None))
+                continue
+            val = kwargs.pop(axis)
+            if isinstance(val, tuple):
+                sel.append(self.bin_slice(axis, *val, level=level))
+            else:
+                s = self.bin_slice(axis, val, val, level=level)
+                sel.append(s.start)
+        if len(kwargs) > 0:
+            raise ValueError(
+                "unknown scan label(s) {}".format(list(kwargs.keys())))
+        return np.asarray(dset[tuple(sel[:dset.ndim])])
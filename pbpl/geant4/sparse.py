@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Sparse (COO) deposition histograms
+
+A sparse histogram is stored in HDF5 as a group rather than a dataset:
+
+* group attributes ``format='coo'``, ``shape`` (dense shape),
+  ``num_events`` and ``unit``
+* ``index[nnz]`` (int64): sorted, C-order flat indices of occupied bins
+* ``value[nnz]`` (float32): bin contents
+
+Both datasets are resizable and chunked in ``chunk_size`` entries,
+regardless of the number of entries of a single run.
+"""
+import numpy as np
+import h5py
+
+chunk_size = 65536
+
+def is_coo(obj):
+    return (
+        isinstance(obj, h5py.Group) and
+        obj.attrs.get('format') == np.string_('coo'))
+
+def coo_sum(index, value):
+    """Sort flat indices and sum values of duplicate indices."""
+    if len(index) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    index, inverse = np.unique(index, return_inverse=True)
+    value = np.bincount(inverse.ravel(), weights=value, minlength=len(index))
+    return index, value
+
+def digitize(x, edges):
+    """Bin index of each value in x, or -1 if outside edges.
+
+    Matches np.histogramdd: bins are half-open except for the last,
+    which includes its upper edge.
+    """
+    result = np.searchsorted(edges, x, side='right') - 1
+    result[x == edges[-1]] = len(edges) - 2
+    result[(result < 0) | (result >= len(edges) - 1)] = -1
+    return result
+
+class SparseHistogram:
+    """Sorted-coordinate accumulator with np.histogramdd semantics.
+
+    Memory scales with the number of occupied bins rather than the
+    size of the bin grid.  Filled entries are buffered and merged into
+    the sorted bins only once the buffer outgrows them, so the total
+    merge cost stays O(N log N) over many fills.
+    """
+    def __init__(self, bin_edges, min_merge=1000000):
+        self.bin_edges = bin_edges
+        self.shape = tuple(len(q)-1 for q in bin_edges)
+        self.min_merge = min_merge
+        self._index = np.zeros(0, dtype=np.int64)
+        self._value = np.zeros(0)
+        self.pending = []
+        self.num_pending = 0
+
+    @property
+    def index(self):
+        self.merge()
+        return self._index
+
+    @property
+    def value(self):
+        self.merge()
+        return self._value
+
+    def fill(self, x, weights):
+        idx = [digitize(x[:,i], q) for i, q in enumerate(self.bin_edges)]
+        mask = np.logical_and.reduce([q >= 0 for q in idx])
+        flat = np.ravel_multi_index(
+            [q[mask] for q in idx], self.shape).astype(np.int64)
+        self.pending.append((flat, np.asarray(weights)[mask]))
+        self.num_pending += len(flat)
+        if self.num_pending > max(len(self._index), self.min_merge):
+            self.merge()
+
+    def merge(self):
+        """Merge buffered entries into the sorted bins."""
+        if len(self.pending) == 0:
+            return
+        index, value = zip(*self.pending)
+        self._index, self._value = coo_sum(
+            np.concatenate((self._index,) + index),
+            np.concatenate((self._value,) + value))
+        self.pending = []
+        self.num_pending = 0
+
+def write_coo(parent, name, index, value, shape, num_events, unit, **kwargs):
+    """Create sparse histogram group.  kwargs are passed on to
+    h5py.Group.create_dataset() for both 'index' and 'value', except
+    for dtype which applies to 'value' only and chunks which is always
+    (chunk_size,)."""
+    gout = parent.create_group(name)
+    gout.attrs.create('format', np.string_('coo'))
+    gout.attrs.create('shape', np.array(shape, dtype=np.int64))
+    gout.attrs.create('num_events', num_events)
+    gout.attrs.create('unit', np.string_(unit))
+    dtype = kwargs.pop('dtype', np.float32)
+    kwargs['chunks'] = (chunk_size,)
+    gout.create_dataset(
+        'index', data=np.asarray(index, dtype=np.int64),
+        maxshape=(None,), **kwargs)
+    gout.create_dataset(
+        'value', data=np.asarray(value), dtype=dtype,
+        maxshape=(None,), **kwargs)
+    return gout
+
+def append_coo(gout, index, value):
+    """Append entries to a sparse histogram group.  Indices must be
+    greater than those already stored."""
+    n = len(gout['index'])
+    for dset_name, A in [('index', index), ('value', value)]:
+        dset = gout[dset_name]
+        dset.resize((n + len(A),))
+        dset[n:] = A
+
+def merge_coo(gout, gin):
+    """Sum sparse histogram gin into gout (in place)."""
+    assert(np.array_equal(gout.attrs['shape'], gin.attrs['shape']))
+    index, value = coo_sum(
+        np.concatenate((gout['index'][()], gin['index'][()])),
+        np.concatenate((gout['value'][()], gin['value'][()])))
+    for dset_name, A in [('index', index), ('value', value)]:
+        dset = gout[dset_name]
+        dset.resize((len(A),))
+        dset[:] = A
+    gout.attrs['num_events'] += gin.attrs['num_events']
+
+def to_dense(gin):
+    """Expand sparse histogram group to a dense array."""
+    shape = tuple(gin.attrs['shape'])
+    result = np.zeros(np.prod(shape, dtype=np.int64), dtype=np.float32)
+    result[gin['index'][()]] = gin['value'][()]
+    return result.reshape(shape)
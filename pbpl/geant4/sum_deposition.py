@@ -4,6 +4,7 @@ import sys
 import argparse
 import numpy as np
 import h5py
+from pbpl.geant4 import sparse
 
 def get_parser():
     parser = argparse.ArgumentParser(
@@ -34,14 +35,23 @@ def main():
 
     # - Any dataset named 'edep', 'hits' or 'num_events' is summed in the
     #   output.
+    # - Sparse (COO) histogram groups are summed bin by bin.
     # - Otherwise, datasets are simply copied to the output.  These
     #   datasets must be identical in each input file.
     with h5py.File(args.outfile, 'w') as fout:
         for filename in args.infiles:
             with h5py.File(filename, 'r') as fin:
                 def visit(k, v):
+                    if sparse.is_coo(v):
+                        if k not in fout:
+                            fin.copy(v, fout, k)
+                        else:
+                            sparse.merge_coo(fout[k], v)
+                        return
                     if not isinstance(v, h5py.Dataset):
                         return
+                    if sparse.is_coo(v.parent):
+                        return
                     if k not in fout:
                         fin.copy(v, fout, k)
                     else:
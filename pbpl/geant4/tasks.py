@@ -12,8 +12,8 @@ import numpy as np
 from collections import namedtuple
 import itertools
 import h5py
-import Geant4 as g4
-from Geant4.hepunit import *
+from . import sparse
+from .core import storage_options_like
 
 class Task:
     def __init__(self, conf, desc, exec_path, show_bar=True, num_events=None):
@@ -172,15 +172,24 @@ def RunMonteCarloSingleIndex(
     # merge results
     # Any dataset with 'num_events' attribute is treated as 'data' and
     # is summed in the output.  Otherwise, datasets are treated as 'bins'
-    # and are simply copied to the output.
+    # and are simply copied to the output.  Sparse (COO) histogram
+    # groups are summed bin by bin.
 
     with h5py.File(out_filename, 'w') as fout:
         for filename in out_filenames:
             num_events = {}
             with h5py.File(filename, 'r') as fin:
                 def visit(k, v):
+                    if sparse.is_coo(v):
+                        if k not in fout:
+                            fin.copy(v, fout, k)
+                        else:
+                            sparse.merge_coo(fout[k], v)
+                        return
                     if not isinstance(v, h5py.Dataset):
                         return
+                    if sparse.is_coo(v.parent):
+                        return
                     if k not in fout:
                         fin.copy(v, fout, k)
                     else:
@@ -230,14 +239,16 @@ def RunMonteCarlo(
             desc, f.name, num_events_per_run[i],
             min_num_events_per_thread, max_num_threads)
 
+    import Geant4.hepunit
     aeval = asteval.Interpreter(use_numpy=True)
-    for q in g4.hepunit.__dict__:
-        aeval.symtable[q] = g4.hepunit.__dict__[q]
+    for q in Geant4.hepunit.__dict__:
+        aeval.symtable[q] = Geant4.hepunit.__dict__[q]
 
     # merge results
     # Any dataset with 'num_events' attribute is treated as 'data' and
     # is summed in the output.  Otherwise, datasets are treated as 'bins'
-    # and are simply copied to the output.
+    # and are simply copied to the output.  Sparse (COO) histogram
+    # groups are concatenated with indices offset into runs_shape.
     path = os.path.dirname(out_filename)
     if path != '':
         os.makedirs(path, exist_ok=True)
@@ -247,6 +258,8 @@ def RunMonteCarlo(
             def visit(k, v):
                 if not isinstance(v, h5py.Dataset):
                     return
+                if sparse.is_coo(v.parent):
+                    return
                 if k not in fout and 'num_events' not in v.attrs:
                     fin.copy(v, fout, k)
             fin.visititems(visit)
@@ -269,16 +282,35 @@ def RunMonteCarlo(
                 def visit(k, v):
                     if 'num_events' not in v.attrs:
                         return
+                    if sparse.is_coo(v):
+                        shape = list(v.attrs['shape'])
+                        if k not in fout:
+                            sparse.write_coo(
+                                fout, k, [], [], runs_shape + shape,
+                                0, v.attrs['unit'],
+                                **storage_options_like(v['value']))
+                            num_events[k] = np.zeros(runs_shape)
+                        offset = np.ravel_multi_index(
+                            i, runs_shape) * np.prod(shape, dtype=np.int64)
+                        sparse.append_coo(
+                            fout[k], v['index'][()] + offset, v['value'][()])
+                        num_events[k][i] = v.attrs['num_events']
+                        return
                     if k not in fout:
                         dset_shape = runs_shape + list(v.shape)
                         dset = fout.create_dataset(
-                            k, shape=dset_shape, dtype='float32')
+                            k, shape=dset_shape,
+                            **storage_options_like(v, runs_shape))
                         num_events[k] = np.zeros(runs_shape)
                         dset.attrs.create('unit', np.string_(v.attrs['unit']))
                     fout[k][i] = v
                     num_events[k][i] = v.attrs['num_events']
                 fin.visititems(visit)
 
+        for k, v in num_events.items():
+            if sparse.is_coo(fout[k]):
+                fout[k].attrs['num_events'] = v
+
         the_num_events = list(num_events.values())[0]
         for v in num_events.values():
             assert(np.array_equal(the_num_events, v))
@@ -75,10 +75,17 @@ setup(
             'pbpl.geant4.boost',
             ['src/boost.cpp',
              'src/ImportedMagneticField.cpp',
+             'src/FieldSteppers.cpp',
+             'src/ArrayParameterisation.cpp',
+             'src/Regions.cpp',
+             'src/StackingAction.cpp',
+             'src/ImportanceBiasing.cpp',
              'src/Particles.cpp',
              'src/PhysicsListEMstd.cpp',
              'src/PhysicsList.cpp',
              'src/pyCADMesh.cpp',
+             'src/SolidCache.cpp',
+             'src/TetrahedralVolume.cpp',
              'src/pyG4MultiSensitiveDetector.cpp',
              'src/pyG4MaterialPropertiesTable.cpp'],
             include_dirs=[
@@ -96,6 +103,7 @@ setup(
                 *geant4_cflags])],
     entry_points = {
         'console_scripts' : [
+            'pbpl-geant4-build-pyramid = pbpl.geant4.pyramid:main',
             'pbpl-geant4-combine-deposition = pbpl.geant4.combine_deposition:main',
             'pbpl-geant4-convert-field = pbpl.geant4.convert_field:main',
             'pbpl-geant4-extrude-vrml = pbpl.geant4.extrude_vrml:main',
@@ -0,0 +1,94 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+//
+// Accuracy and cost of linear vs cubic interpolation in
+// ImportedMagneticField, against the analytic field of make_field.py.
+//
+//   > python make_field.py 32
+//   > make field_accuracy
+//   > ./field_accuracy field.h5
+#include <iostream>
+#include <chrono>
+#include <random>
+#include <cmath>
+#include <G4SystemOfUnits.hh>
+#include "ImportedMagneticField.h"
+
+#undef H5_USE_BOOST
+#define H5_USE_BOOST
+#include "highfive/H5File.hpp"
+#include "highfive/H5Easy.hpp"
+
+void analytic_field(const double x[3], double *B)
+{
+    const double z = x[2] / meter;
+    const double g = 10.0 * std::exp(-(z/0.2)*(z/0.2));
+    B[0] = g * x[1]/meter * tesla;
+    B[1] = g * x[0]/meter * tesla;
+    B[2] = 0.1 * g * x[0]/meter * x[1]/meter * tesla;
+}
+
+void compare(const ImportedMagneticField& field,
+             const std::vector<double>& points, const std::string& label)
+{
+    double result[6], exact[3];
+    double max_err = 0.0, sum_err2 = 0.0, max_B = 0.0;
+    for (size_t i=0; i<points.size(); i+=4) {
+        field.GetFieldValue(&points[i], result);
+        analytic_field(&points[i], exact);
+        double err2 = 0.0, B2 = 0.0;
+        for (unsigned j=0; j<3; ++j) {
+            err2 += (result[j]-exact[j]) * (result[j]-exact[j]);
+            B2 += exact[j] * exact[j];
+        }
+        max_err = std::max(max_err, std::sqrt(err2));
+        max_B = std::max(max_B, std::sqrt(B2));
+        sum_err2 += err2;
+    }
+    const double rms_err = std::sqrt(sum_err2 / (points.size()/4));
+
+    double sum = 0.0;
+    auto t0 = std::chrono::steady_clock::now();
+    for (size_t i=0; i<points.size(); i+=4) {
+        field.GetFieldValue(&points[i], result);
+        sum += result[0] + result[1] + result[2];
+    }
+    auto t1 = std::chrono::steady_clock::now();
+    if (sum == 12345.6789)
+        std::cout << sum;
+    const double t = std::chrono::duration<double, std::nano>(t1-t0).count()
+        / (points.size()/4);
+
+    std::cout << label << ": max error " << max_err/max_B
+              << ", rms error " << rms_err/max_B
+              << " (relative to max |B|), " << t << " ns/lookup\n";
+}
+
+int main(int argc, char *argv[])
+{
+    const std::string filename = argc > 1 ? argv[1] : "field.h5";
+    const unsigned num_points = argc > 2 ? std::atoi(argv[2]) : 1000000;
+
+    HighFive::File fin(filename, HighFive::File::ReadOnly);
+    double lo[3], hi[3];
+    const char *dset_names[] = { "/xvals", "/yvals", "/zvals" };
+    for (unsigned i=0; i<3; ++i) {
+        auto v = H5Easy::load<std::vector<double> >(fin, dset_names[i]);
+        lo[i] = v.front() * meter;
+        hi[i] = v.back() * meter;
+    }
+
+    std::mt19937 gen(12345);
+    std::uniform_real_distribution<double> u(0.0, 1.0);
+    std::vector<double> points;
+    for (unsigned n=0; n<num_points; ++n) {
+        for (unsigned i=0; i<3; ++i)
+            points.push_back(lo[i] + u(gen)*(hi[i]-lo[i]));
+        points.push_back(0.0);
+    }
+
+    ImportedMagneticField field(filename);
+    compare(field, points, "linear");
+    field.setInterpolation("cubic");
+    compare(field, points, "cubic ");
+    return 0;
+}
@@ -0,0 +1,158 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+//
+// Benchmark ImportedMagneticField::GetFieldValue against the
+// original [component][ix][iy][iz] layout.
+//
+//   > python make_field.py 128
+//   > make
+//   > ./field_lookup field.h5
+//
+// Two access patterns are timed: 'track' walks small steps along
+// straight lines (as Geant4 does), 'random' samples uniformly.
+#include <iostream>
+#include <chrono>
+#include <random>
+#include <cmath>
+#include <G4SystemOfUnits.hh>
+#include "ImportedMagneticField.h"
+
+#undef H5_USE_BOOST
+#define H5_USE_BOOST
+#include "highfive/H5File.hpp"
+#include "highfive/H5Easy.hpp"
+
+class LegacyField
+{
+public:
+    LegacyField(const std::string& filename) {
+        HighFive::File fin(filename, HighFive::File::ReadOnly);
+        const char *dset_names[] = { "/xvals", "/yvals", "/zvals" };
+        for (unsigned i=0; i<3; ++i) {
+            auto v = H5Easy::load<std::vector<float> >(fin, dset_names[i]);
+            x0[i] = v.front() * meter;
+            x1[i] = v.back() * meter;
+            dx[i] = (x1[i] - x0[i]) / (v.size() - 1);
+        }
+        HighFive::DataSet dset = fin.getDataSet("/B_field");
+        field.resize(dset.getSpace().getDimensions());
+        dset.read(field);
+        for (unsigned i=0; i<field.num_elements(); ++i)
+            field.data()[i] *= tesla;
+    }
+    void GetFieldValue(const double x[4], double *result) const {
+        result[0] = result[1] = result[2] = 0.0;
+        if (x[0]>=x0[0] && x[0]<x1[0] &&
+            x[1]>=x0[1] && x[1]<x1[1] &&
+            x[2]>=x0[2] && x[2]<x1[2]) {
+            int idx[3];
+            double xd[3];
+            for (unsigned i=0; i<3; ++i) {
+                double temp;
+                xd[i] = std::modf((x[i]-x0[i])/dx[i], &temp);
+                idx[i] = static_cast<int>(std::floor(temp));
+            }
+            for (unsigned i=0; i<3; ++i) {
+                const float c000 = field[i][idx[0]  ][idx[1]  ][idx[2]  ];
+                const float c001 = field[i][idx[0]  ][idx[1]  ][idx[2]+1];
+                const float c010 = field[i][idx[0]  ][idx[1]+1][idx[2]  ];
+                const float c011 = field[i][idx[0]  ][idx[1]+1][idx[2]+1];
+                const float c100 = field[i][idx[0]+1][idx[1]  ][idx[2]  ];
+                const float c101 = field[i][idx[0]+1][idx[1]  ][idx[2]+1];
+                const float c110 = field[i][idx[0]+1][idx[1]+1][idx[2]  ];
+                const float c111 = field[i][idx[0]+1][idx[1]+1][idx[2]+1];
+                result[i] = (
+                    c000*(1-xd[0])*(1-xd[1])*(1-xd[2]) +
+                    c001*(1-xd[0])*(1-xd[1])*xd[2]  +
+                    c010*(1-xd[0])*xd[1]*(1-xd[2]) +
+                    c011*(1-xd[0])*xd[1]*xd[2]  +
+                    c100*xd[0]*(1-xd[1])*(1-xd[2]) +
+                    c101*xd[0]*(1-xd[1])*xd[2] +
+                    c110*xd[0]*xd[1]*(1-xd[2]) +
+                    c111*xd[0]*xd[1]*xd[2]);
+            }
+        }
+    }
+private:
+    boost::multi_array<float, 4> field;
+    double x0[3], x1[3], dx[3];
+};
+
+std::vector<double> make_points(
+    const std::string& pattern, const double lo[3], const double hi[3],
+    unsigned num_points)
+{
+    std::mt19937 gen(12345);
+    std::uniform_real_distribution<double> u(0.0, 1.0);
+    std::vector<double> result;
+    result.reserve(4*num_points);
+    double x[3], dir[3];
+    const double step = 0.1*mm;
+    unsigned count = 0;
+    while (result.size() < 4*num_points) {
+        if (pattern == "random" || count == 0) {
+            for (unsigned i=0; i<3; ++i)
+                x[i] = lo[i] + u(gen)*(hi[i]-lo[i]);
+            double norm = 0.0;
+            for (unsigned i=0; i<3; ++i) {
+                dir[i] = u(gen) - 0.5;
+                norm += dir[i]*dir[i];
+            }
+            for (unsigned i=0; i<3; ++i)
+                dir[i] /= std::sqrt(norm);
+            count = 1000;
+        }
+        for (unsigned i=0; i<3; ++i) {
+            x[i] += step*dir[i];
+            if (x[i] < lo[i] || x[i] >= hi[i])
+                count = 1;
+        }
+        if (count > 1)
+            result.insert(result.end(), { x[0], x[1], x[2], 0.0 });
+        --count;
+    }
+    return result;
+}
+
+template<class Field>
+double time_lookups(const Field& field, const std::vector<double>& points)
+{
+    double result[6], sum = 0.0;
+    auto t0 = std::chrono::steady_clock::now();
+    for (size_t i=0; i<points.size(); i+=4) {
+        field.GetFieldValue(&points[i], result);
+        sum += result[0] + result[1] + result[2];
+    }
+    auto t1 = std::chrono::steady_clock::now();
+    if (sum == 12345.6789)
+        std::cout << sum;
+    return std::chrono::duration<double, std::nano>(t1-t0).count() /
+        (points.size()/4);
+}
+
+int main(int argc, char *argv[])
+{
+    const std::string filename = argc > 1 ? argv[1] : "field.h5";
+    const unsigned num_points = argc > 2 ? std::atoi(argv[2]) : 10000000;
+
+    HighFive::File fin(filename, HighFive::File::ReadOnly);
+    double lo[3], hi[3];
+    const char *dset_names[] = { "/xvals", "/yvals", "/zvals" };
+    for (unsigned i=0; i<3; ++i) {
+        auto v = H5Easy::load<std::vector<float> >(fin, dset_names[i]);
+        lo[i] = v.front() * meter;
+        hi[i] = v.back() * meter;
+    }
+
+    LegacyField legacy(filename);
+    ImportedMagneticField current(filename);
+
+    for (const std::string pattern : { "track", "random" }) {
+        auto points = make_points(pattern, lo, hi, num_points);
+        const double t_legacy = time_lookups(legacy, points);
+        const double t_current = time_lookups(current, points);
+        std::cout << pattern << ": legacy " << t_legacy << " ns/lookup, "
+                  << "current " << t_current << " ns/lookup, "
+                  << "speedup " << t_legacy/t_current << "\n";
+    }
+    return 0;
+}
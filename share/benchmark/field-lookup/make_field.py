@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+import sys
+import numpy as np
+import h5py
+
+# Synthetic quadrupole-like field on a uniform grid (pbpl-geant4 format)
+def main():
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 128
+    xvals = np.linspace(-0.05, 0.05, N)
+    yvals = np.linspace(-0.05, 0.05, N)
+    zvals = np.linspace(-0.5, 0.5, 4*N)
+    x, y, z = np.meshgrid(xvals, yvals, zvals, indexing='ij')
+    g = 10.0 * np.exp(-(z/0.2)**2)
+    B = np.array((g*y, g*x, 0.1*g*x*y), dtype=np.float32)
+    with h5py.File('field.h5', 'w') as f:
+        f['xvals'] = xvals
+        f['yvals'] = yvals
+        f['zvals'] = zvals
+        f.create_dataset('B_field', data=B, compression='gzip')
+
+if __name__ == '__main__':
+    sys.exit(main())
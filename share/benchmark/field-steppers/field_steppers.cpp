@@ -0,0 +1,109 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+//
+// Throughput and tracking error of the field presets of
+// FieldSteppers.h.
+//
+//   > make
+//   > ./field_steppers [B/tesla] [kinetic energy/MeV] [path length/m]
+//
+// An electron is propagated through a uniform field with the chord
+// finder of each preset, stepping as G4PropagatorInField does in an
+// unbounded volume.  The endpoint is compared with the analytic helix.
+// 'helix' is exact for uniform fields only; for imported maps the
+// relative cost of the Runge-Kutta presets is what carries over.
+#include <iostream>
+#include <iomanip>
+#include <chrono>
+#include <cmath>
+#include <algorithm>
+#include <G4SystemOfUnits.hh>
+#include <G4PhysicalConstants.hh>
+#include <G4UniformMagField.hh>
+#include <G4FieldManager.hh>
+#include <G4ChordFinder.hh>
+#include <G4FieldTrack.hh>
+#include <G4ChargeState.hh>
+#include <G4EquationOfMotion.hh>
+#include "FieldSteppers.h"
+
+// Uniform field that counts evaluations
+class CountingField : public G4UniformMagField
+{
+public:
+    CountingField(const G4ThreeVector& B) : G4UniformMagField(B) { }
+    void GetFieldValue(const double x[4], double *B) const {
+        ++count;
+        G4UniformMagField::GetFieldValue(x, B);
+    }
+    mutable unsigned long count = 0;
+};
+
+int main(int argc, char *argv[])
+{
+    const double Bz = (argc > 1 ? std::atof(argv[1]) : 1.0) * tesla;
+    const double KE = (argc > 2 ? std::atof(argv[2]) : 10.0) * MeV;
+    const double path_length = (argc > 3 ? std::atof(argv[3]) : 10.0) * m;
+    const double max_step = 1.0*m;
+
+    const double mass = electron_mass_c2;
+    const double charge = -eplus;
+    const double p = std::sqrt(KE*(KE + 2*mass));
+    const double pitch = 0.3;
+    const G4ThreeVector dir(std::cos(pitch), 0.0, std::sin(pitch));
+
+    // analytic position after arc length s (dp/ds = q c (u x B) / p)
+    const double w = charge * c_light * Bz / p;
+    auto helix = [&](double s) {
+        const double st = std::cos(pitch);
+        return G4ThreeVector(
+            st/w * std::sin(w*s),
+            -st/w * (1 - std::cos(w*s)),
+            std::sin(pitch) * s);
+    };
+
+    std::cout << std::setw(10) << "preset"
+              << std::setw(20) << "stepper"
+              << std::setw(12) << "steps"
+              << std::setw(14) << "evals/step"
+              << std::setw(14) << "steps/s"
+              << std::setw(14) << "error/mm" << "\n";
+    for (const auto& name : fieldPresetNames()) {
+        const FieldSettings settings = fieldPreset(name);
+        CountingField field(G4ThreeVector(0.0, 0.0, Bz));
+        G4FieldManager field_manager;
+        configureFieldManager(&field_manager, &field, settings);
+        G4ChordFinder *chord_finder = field_manager.GetChordFinder();
+        chord_finder->GetIntegrationDriver()->GetEquationOfMotion()
+            ->SetChargeMomentumMass(G4ChargeState(charge/eplus), p, mass);
+
+        G4FieldTrack track(
+            G4ThreeVector(), 0.0, dir, KE, mass, charge/eplus,
+            G4ThreeVector());
+        unsigned long num_steps = 0;
+        field.count = 0;
+        auto t0 = std::chrono::steady_clock::now();
+        while (track.GetCurveLength() < path_length) {
+            const double step = std::min(
+                max_step, path_length - track.GetCurveLength());
+            const double eps = std::max(
+                settings.min_epsilon_step,
+                std::min(settings.max_epsilon_step,
+                         settings.delta_one_step / step));
+            chord_finder->AdvanceChordLimited(
+                track, step, eps, track.GetPosition(), 0.0);
+            ++num_steps;
+        }
+        auto t1 = std::chrono::steady_clock::now();
+        const double seconds = std::chrono::duration<double>(t1-t0).count();
+        const double error =
+            (track.GetPosition() - helix(track.GetCurveLength())).mag();
+
+        std::cout << std::setw(10) << name
+                  << std::setw(20) << settings.stepper
+                  << std::setw(12) << num_steps
+                  << std::setw(14) << double(field.count)/num_steps
+                  << std::setw(14) << num_steps/seconds
+                  << std::setw(14) << error/mm << "\n";
+    }
+    return 0;
+}
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+import os
+import sys
+import subprocess
+import copy
+import time
+import numpy as np
+import h5py
+import toml
+
+# Weighted totals of shield.toml with importance biasing off and on,
+# each from N runs of pbpl-geant4-mc:
+#
+#   > ./compare.py [N]
+#
+# Deposited energy in the detector and energy killed by the stacking
+# limits (summed over track weights) should agree within errors.  The
+# stacking limits apply before splitting, so clones are never killed.
+def run(conf, mode, index):
+    conf = copy.deepcopy(conf)
+    if mode == 'off':
+        del conf['ImportanceBiasing']
+    prefix = 'out/{}-{}-'.format(mode, index)
+    conf['Detectors']['Detector']['File'] = prefix + 'edep.h5'
+    conf['StackingAction']['File'] = prefix + 'stacking.h5'
+    os.makedirs('out', exist_ok=True)
+    with open(prefix + 'shield.toml', 'w') as f:
+        toml.dump(conf, f)
+    t0 = time.perf_counter()
+    subprocess.run(
+        ['pbpl-geant4-mc', prefix + 'shield.toml'], check=True,
+        stdout=subprocess.DEVNULL)
+    dt = time.perf_counter() - t0
+    with h5py.File(prefix + 'edep.h5', 'r') as fin:
+        num_events = fin['edep'].attrs['num_events']
+        edep = fin['edep'][()].sum() * 1e-3 / num_events
+    with h5py.File(prefix + 'stacking.h5', 'r') as fin:
+        killed = fin['killed_energy'][()].sum() / num_events
+    return edep, killed, dt
+
+def main():
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    conf = toml.load('shield.toml')
+    print('{:10s} {:>22s} {:>22s} {:>10s}'.format(
+        'biasing', 'edep/MeV per event', 'killed/MeV per event', 'FOM'))
+    for mode in ['off', 'on']:
+        result = np.array([run(conf, mode, i) for i in range(N)])
+        mean = result.mean(axis=0)
+        err = result.std(axis=0, ddof=1) / np.sqrt(N)
+        # figure of merit 1/(relative variance * CPU time)
+        fom = 1 / ((err[0]/mean[0])**2 * result[:,2].sum())
+        print('{:10s} {:>22s} {:>22s} {:10.3g}'.format(
+            mode,
+            '{:.4g} +- {:.2g}'.format(mean[0], err[0]),
+            '{:.4g} +- {:.2g}'.format(mean[1], err[1]), fom))
+
+if __name__ == '__main__':
+    sys.exit(main())
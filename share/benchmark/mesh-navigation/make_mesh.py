@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+import sys
+import numpy as np
+
+# Wavy torus as binary STL (units of mm), 2*N*4N triangles
+def main():
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 160
+    u = np.linspace(0, 2*np.pi, 4*N, endpoint=False)
+    v = np.linspace(0, 2*np.pi, N, endpoint=False)
+    U, V = np.meshgrid(u, v, indexing='ij')
+    r = 20.0 * (1 + 0.1*np.sin(7*U) * np.cos(5*V))
+    R = 60.0
+    P = np.array((
+        (R + r*np.cos(V)) * np.cos(U),
+        (R + r*np.cos(V)) * np.sin(U),
+        r*np.sin(V))).transpose((1, 2, 0))
+    P1 = np.roll(P, -1, axis=0)
+    P2 = np.roll(P, -1, axis=1)
+    P3 = np.roll(P1, -1, axis=1)
+    tri = np.concatenate((
+        np.stack((P, P1, P3), axis=2).reshape(-1, 3, 3),
+        np.stack((P, P3, P2), axis=2).reshape(-1, 3, 3)))
+    normal = np.cross(tri[:,1]-tri[:,0], tri[:,2]-tri[:,0])
+    normal /= np.linalg.norm(normal, axis=1)[:,np.newaxis]
+    record = np.zeros(len(tri), dtype=[
+        ('normal', '<f4', 3), ('vertex', '<f4', (3, 3)), ('attr', '<u2')])
+    record['normal'] = normal
+    record['vertex'] = tri
+    with open('mesh.stl', 'wb') as f:
+        f.write(b'\0' * 80)
+        f.write(np.uint32(len(tri)).tobytes())
+        f.write(record.tobytes())
+
+if __name__ == '__main__':
+    sys.exit(main())
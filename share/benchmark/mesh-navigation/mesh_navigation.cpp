@@ -0,0 +1,130 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+//
+// Navigation speed of a large CAD mesh as one G4TessellatedSolid (at
+// several voxel budgets) and as a TetrahedralVolume.
+//
+//   > python make_mesh.py 160
+//   > make
+//   > ./mesh_navigation mesh.stl
+//
+// Rays start at random points of the mesh bounding box, travel in
+// random directions, and are stepped through the geometry with a
+// G4Navigator until they leave the world (the loop of G4Transportation
+// without physics).  Reported are build time and time per step.
+#include <iostream>
+#include <iomanip>
+#include <chrono>
+#include <random>
+#include <G4SystemOfUnits.hh>
+#include <G4NistManager.hh>
+#include <G4Box.hh>
+#include <G4LogicalVolume.hh>
+#include <G4PVPlacement.hh>
+#include <G4Navigator.hh>
+#include <G4GeometryManager.hh>
+#include <G4TessellatedSolid.hh>
+#include <CADMesh.hh>
+#include "SolidCache.h"
+#include "TetrahedralVolume.h"
+
+typedef std::chrono::steady_clock clock_type;
+
+double seconds_since(clock_type::time_point t0)
+{
+    return std::chrono::duration<double>(clock_type::now() - t0).count();
+}
+
+void run(const std::string& label, G4LogicalVolume *logical,
+         const G4ThreeVector& offset, const G4ThreeVector& lo,
+         const G4ThreeVector& hi, double build_time, unsigned num_rays)
+{
+    auto galactic = G4NistManager::Instance()->FindOrBuildMaterial(
+        "G4_Galactic");
+    const G4ThreeVector half = 0.6 * (hi - lo) + G4ThreeVector(1, 1, 1)*cm;
+    auto world_logical = new G4LogicalVolume(
+        new G4Box("World", 2*half.x(), 2*half.y(), 2*half.z()),
+        galactic, "World");
+    auto world = new G4PVPlacement(
+        nullptr, G4ThreeVector(), world_logical, "World", nullptr,
+        false, 0);
+    new G4PVPlacement(
+        nullptr, offset, logical, label, world_logical, false, 0);
+    G4GeometryManager::GetInstance()->CloseGeometry(true, false, world);
+
+    G4Navigator navigator;
+    navigator.SetWorldVolume(world);
+    std::mt19937 gen(12345);
+    std::uniform_real_distribution<double> u(0.0, 1.0);
+    unsigned long num_steps = 0;
+    auto t0 = clock_type::now();
+    for (unsigned i=0; i<num_rays; ++i) {
+        G4ThreeVector x(
+            lo.x() + u(gen)*(hi.x()-lo.x()),
+            lo.y() + u(gen)*(hi.y()-lo.y()),
+            lo.z() + u(gen)*(hi.z()-lo.z()));
+        const double cos_theta = 2*u(gen) - 1;
+        const double phi = 2*M_PI*u(gen);
+        const double sin_theta = std::sqrt(1 - cos_theta*cos_theta);
+        const G4ThreeVector dir(
+            sin_theta*std::cos(phi), sin_theta*std::sin(phi), cos_theta);
+        G4VPhysicalVolume *volume =
+            navigator.LocateGlobalPointAndSetup(x, &dir, false, false);
+        while (volume != nullptr) {
+            double safety;
+            double step = navigator.ComputeStep(x, dir, kInfinity, safety);
+            x += step * dir;
+            navigator.SetGeometricallyLimitedStep();
+            volume = navigator.LocateGlobalPointAndSetup(x, &dir, true, false);
+            ++num_steps;
+        }
+    }
+    const double t = seconds_since(t0);
+    G4GeometryManager::GetInstance()->OpenGeometry(world);
+
+    std::cout << std::setw(24) << label
+              << std::setw(12) << build_time
+              << std::setw(12) << num_steps
+              << std::setw(14) << 1e6*t/num_steps << "\n";
+}
+
+int main(int argc, char *argv[])
+{
+    const std::string filename = argc > 1 ? argv[1] : "mesh.stl";
+    const unsigned num_rays = argc > 2 ? std::atoi(argv[2]) : 10000;
+    auto material = G4NistManager::Instance()->FindOrBuildMaterial("G4_Fe");
+    auto galactic = G4NistManager::Instance()->FindOrBuildMaterial(
+        "G4_Galactic");
+
+    std::cout << std::setw(24) << "mode"
+              << std::setw(12) << "build/s"
+              << std::setw(12) << "steps"
+              << std::setw(14) << "us/step" << "\n";
+
+    auto t0 = clock_type::now();
+    CADMesh::TessellatedMesh mesh(const_cast<char*>(filename.c_str()));
+    G4VSolid *parsed = mesh.GetSolid(0);
+    const double parse_time = seconds_since(t0);
+    G4ThreeVector lo, hi;
+    parsed->BoundingLimits(lo, hi);
+    std::cout << "facets: "
+              << dynamic_cast<G4TessellatedSolid*>(parsed)->GetNumberOfFacets()
+              << ", parse time " << parse_time << " s\n";
+    writeSolidCache(parsed, "mesh.msh");
+
+    for (int max_voxels : { 0, 1000, 10000, 100000, 1000000 }) {
+        t0 = clock_type::now();
+        G4VSolid *solid = readSolidCache("mesh.msh", "mesh", max_voxels);
+        const double build_time = seconds_since(t0);
+        run("voxels=" + (max_voxels > 0 ?
+                         std::to_string(max_voxels) : std::string("default")),
+            new G4LogicalVolume(solid, material, "mesh"), G4ThreeVector(),
+            lo, hi, build_time, num_rays);
+    }
+
+    t0 = clock_type::now();
+    TetrahedralVolume tet(filename, "mesh", material, galactic);
+    const double build_time = seconds_since(t0);
+    run("tetrahedral (" + std::to_string(tet.getNumberOfTetrahedra()) + ")",
+        tet.getEnvelope(), tet.getCenter(), lo, hi, build_time, num_rays);
+    return 0;
+}
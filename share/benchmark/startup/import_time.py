@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+import sys
+import subprocess
+import time
+import re as regex
+
+# Import time of every pbpl-geant4 console script, best of N fresh
+# interpreters.  Modules that pull in Geant4 are flagged.
+def entry_points():
+    setup_py = sys.argv[2] if len(sys.argv) > 2 else '../../../setup.py'
+    with open(setup_py) as f:
+        text = f.read()
+    return regex.findall(r"'(pbpl-geant4-[\w-]+) = ([\w.]+):main'", text)
+
+def measure(module):
+    code = 'import sys, {0}; print(int("Geant4" in sys.modules))'.format(
+        module)
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, '-c', code], stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, universal_newlines=True)
+    dt = time.perf_counter() - t0
+    if proc.returncode != 0:
+        return None, proc.stderr.strip().splitlines()[-1]
+    return dt, 'Geant4' if proc.stdout.strip().endswith('1') else ''
+
+def main():
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    baseline = min(measure('os')[0] for i in range(N))
+    print('{:36s} {:>10s}'.format('interpreter', '{:.0f} ms'.format(
+        1e3*baseline)))
+    for script, module in entry_points():
+        results = [measure(module) for i in range(N)]
+        dt, note = results[0]
+        if dt is None:
+            print('{:36s} {:>10s}  {}'.format(script, 'failed', note))
+            continue
+        dt = min(x[0] for x in results)
+        print('{:36s} {:>10s}  {}'.format(
+            script, '{:.0f} ms'.format(1e3*(dt - baseline)), note))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#include <sstream>
+#include <G4VPhysicalVolume.hh>
+#include <G4PVParameterised.hh>
+#include "ArrayParameterisation.h"
+#include "Exception.h"
+
+ArrayParameterisation::ArrayParameterisation(
+    int nx, int ny, int nz, const G4ThreeVector& pitch,
+    const G4Transform3D& transform)
+    : count { nx, ny, nz }, pitch(pitch),
+      rotation(transform.getRotation()),
+      frame_rotation(transform.getRotation().inverse()),
+      translation(transform.getTranslation())
+{
+    if (nx < 1 || ny < 1 || nz < 1)
+        pbpl_throw("array counts must be positive");
+}
+
+void ArrayParameterisation::ComputeTransformation(
+    const G4int copy_no, G4VPhysicalVolume *physical) const
+{
+    const int ix = copy_no % count[0];
+    const int iy = (copy_no / count[0]) % count[1];
+    const int iz = copy_no / (count[0] * count[1]);
+    const G4ThreeVector offset(
+        (ix - 0.5*(count[0]-1)) * pitch.x(),
+        (iy - 0.5*(count[1]-1)) * pitch.y(),
+        (iz - 0.5*(count[2]-1)) * pitch.z());
+    physical->SetTranslation(translation + rotation * offset);
+    // G4PVParameterised shares one rotation object among all copies
+    physical->SetRotation(const_cast<G4RotationMatrix*>(&frame_rotation));
+}
+
+G4VPhysicalVolume* placeArray(
+    const std::string& name, G4LogicalVolume *logical,
+    G4LogicalVolume *mother_logical, int nx, int ny, int nz,
+    const G4ThreeVector& pitch, const G4Transform3D& transform)
+{
+    auto param = new ArrayParameterisation(nx, ny, nz, pitch, transform);
+    return new G4PVParameterised(
+        name, logical, mother_logical, kUndefined,
+        param->getNumberOfCopies(), param);
+}
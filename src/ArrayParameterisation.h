@@ -0,0 +1,41 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#ifndef ARRAY_PARAMETERISATION_H
+#define ARRAY_PARAMETERISATION_H
+
+#include <string>
+#include <G4VPVParameterisation.hh>
+#include <G4ThreeVector.hh>
+#include <G4RotationMatrix.hh>
+#include <G4Transform3D.hh>
+
+class G4LogicalVolume;
+
+// Regular nx*ny*nz array of identical volumes, centered on transform
+// and spaced by pitch (array frame).  Copy number is
+// ix + nx*(iy + ny*iz).
+class ArrayParameterisation : public G4VPVParameterisation
+{
+public:
+    ArrayParameterisation(
+        int nx, int ny, int nz, const G4ThreeVector& pitch,
+        const G4Transform3D& transform);
+    void ComputeTransformation(
+        const G4int copy_no, G4VPhysicalVolume *physical) const override;
+    int getNumberOfCopies() const { return count[0]*count[1]*count[2]; }
+private:
+    int count[3];
+    G4ThreeVector pitch;
+    G4RotationMatrix rotation;
+    G4RotationMatrix frame_rotation;
+    G4ThreeVector translation;
+};
+
+// Place array of logical in mother_logical with a single
+// G4PVParameterised, so memory and construction time do not grow
+// with the number of copies.
+G4VPhysicalVolume* placeArray(
+    const std::string& name, G4LogicalVolume *logical,
+    G4LogicalVolume *mother_logical, int nx, int ny, int nz,
+    const G4ThreeVector& pitch, const G4Transform3D& transform);
+
+#endif
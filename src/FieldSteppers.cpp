@@ -0,0 +1,139 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#include <map>
+#include <sstream>
+#include <functional>
+#include <G4SystemOfUnits.hh>
+#include <G4FieldManager.hh>
+#include <G4ChordFinder.hh>
+#include <G4MagIntegratorDriver.hh>
+#include <G4Mag_UsualEqRhs.hh>
+#include <G4ClassicalRK4.hh>
+#include <G4SimpleRunge.hh>
+#include <G4SimpleHeum.hh>
+#include <G4CashKarpRKF45.hh>
+#include <G4BogackiShampine23.hh>
+#include <G4BogackiShampine45.hh>
+#include <G4DormandPrince745.hh>
+#include <G4DormandPrinceRK56.hh>
+#include <G4DormandPrinceRK78.hh>
+#include <G4TsitourasRK45.hh>
+#include <G4NystromRK4.hh>
+#include <G4HelixExplicitEuler.hh>
+#include <G4HelixImplicitEuler.hh>
+#include <G4HelixSimpleRunge.hh>
+#include <G4ExactHelixStepper.hh>
+#include "FieldSteppers.h"
+#include "Exception.h"
+
+namespace {
+
+typedef std::function<G4MagIntegratorStepper*(G4Mag_EqRhs*)> factory_t;
+
+template<class T>
+factory_t make_factory()
+{
+    return [](G4Mag_EqRhs *equation) { return new T(equation); };
+}
+
+const std::map<std::string, factory_t>& stepper_factories()
+{
+    static const std::map<std::string, factory_t> result {
+        { "ClassicalRK4", make_factory<G4ClassicalRK4>() },
+        { "SimpleRunge", make_factory<G4SimpleRunge>() },
+        { "SimpleHeum", make_factory<G4SimpleHeum>() },
+        { "CashKarpRKF45", make_factory<G4CashKarpRKF45>() },
+        { "BogackiShampine23", make_factory<G4BogackiShampine23>() },
+        { "BogackiShampine45", make_factory<G4BogackiShampine45>() },
+        { "DormandPrince745", make_factory<G4DormandPrince745>() },
+        { "DormandPrinceRK56", make_factory<G4DormandPrinceRK56>() },
+        { "DormandPrinceRK78", make_factory<G4DormandPrinceRK78>() },
+        { "TsitourasRK45", make_factory<G4TsitourasRK45>() },
+        { "NystromRK4", make_factory<G4NystromRK4>() },
+        { "HelixExplicitEuler", make_factory<G4HelixExplicitEuler>() },
+        { "HelixImplicitEuler", make_factory<G4HelixImplicitEuler>() },
+        { "HelixSimpleRunge", make_factory<G4HelixSimpleRunge>() },
+        { "ExactHelix", make_factory<G4ExactHelixStepper>() }
+    };
+    return result;
+}
+
+const std::map<std::string, FieldSettings>& presets()
+{
+    static const std::map<std::string, FieldSettings> result {
+        { "default",
+          { "default", 0.01*mm, 0.25*mm, 0.01*mm, 0.001*mm,
+            5e-5, 1e-3 } },
+        { "fast",
+          { "BogackiShampine23", 0.1*mm, 1.0*mm, 0.1*mm, 0.01*mm,
+            1e-4, 5e-3 } },
+        { "accurate",
+          { "DormandPrince745", 0.001*mm, 0.05*mm, 0.001*mm, 0.0001*mm,
+            1e-6, 1e-5 } },
+        { "helix",
+          { "ExactHelix", 0.01*mm, 0.25*mm, 0.01*mm, 0.001*mm,
+            5e-5, 1e-3 } }
+    };
+    return result;
+}
+
+}
+
+FieldSettings fieldPreset(const std::string& name)
+{
+    auto i = presets().find(name);
+    if (i == presets().end())
+        pbpl_throw("unknown field preset '" + name + "'");
+    return i->second;
+}
+
+std::vector<std::string> fieldPresetNames()
+{
+    std::vector<std::string> result;
+    for (const auto& x : presets())
+        result.push_back(x.first);
+    return result;
+}
+
+G4MagIntegratorStepper* createStepper(
+    const std::string& name, G4Mag_EqRhs *equation)
+{
+    auto i = stepper_factories().find(name);
+    if (i == stepper_factories().end())
+        pbpl_throw("unknown stepper '" + name + "'");
+    return i->second(equation);
+}
+
+std::vector<std::string> stepperNames()
+{
+    std::vector<std::string> result { "default" };
+    for (const auto& x : stepper_factories())
+        result.push_back(x.first);
+    return result;
+}
+
+void configureFieldManager(
+    G4FieldManager *field_manager, G4MagneticField *field,
+    const FieldSettings& settings)
+{
+    G4ChordFinder *chord_finder;
+    if (settings.stepper == "default") {
+        // as G4FieldManager::CreateChordFinder: stepper and driver
+        // chosen by the installed Geant4 version
+        chord_finder = new G4ChordFinder(field, settings.min_step);
+    }
+    else {
+        auto equation = new G4Mag_UsualEqRhs(field);
+        auto stepper = createStepper(settings.stepper, equation);
+        auto driver = new G4MagInt_Driver(
+            settings.min_step, stepper, stepper->GetNumberOfVariables());
+        chord_finder = new G4ChordFinder(driver);
+    }
+    chord_finder->SetDeltaChord(settings.delta_chord);
+
+    field_manager->SetDetectorField(field);
+    field_manager->SetChordFinder(chord_finder);
+    field_manager->SetDeltaOneStep(settings.delta_one_step);
+    field_manager->SetDeltaIntersection(settings.delta_intersection);
+    field_manager->SetMinimumEpsilonStep(settings.min_epsilon_step);
+    field_manager->SetMaximumEpsilonStep(settings.max_epsilon_step);
+}
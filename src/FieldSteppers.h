@@ -0,0 +1,49 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#ifndef FIELD_STEPPERS_H
+#define FIELD_STEPPERS_H
+
+#include <string>
+#include <vector>
+
+class G4FieldManager;
+class G4MagneticField;
+class G4Mag_EqRhs;
+class G4MagIntegratorStepper;
+
+// Integrator stepper and propagation tolerances of a field manager.
+// Lengths are in Geant4 internal units.
+struct FieldSettings
+{
+    std::string stepper;
+    double min_step;
+    double delta_chord;
+    double delta_one_step;
+    double delta_intersection;
+    double min_epsilon_step;
+    double max_epsilon_step;
+};
+
+// Stepper "default" is the chord finder Geant4 creates itself
+// (G4FieldManager::CreateChordFinder; DormandPrince745 in current
+// versions).
+//
+// Named presets:
+//   default:  Geant4's default chord finder and tolerances
+//   fast:     low-order stepper, loose tolerances
+//   accurate: Dormand-Prince 7(4)5, tight tolerances
+//   helix:    exact helix stepper (uniform fields only)
+FieldSettings fieldPreset(const std::string& name);
+std::vector<std::string> fieldPresetNames();
+
+G4MagIntegratorStepper* createStepper(
+    const std::string& name, G4Mag_EqRhs *equation);
+std::vector<std::string> stepperNames();
+
+// Attach field to field manager with new chord finder built from
+// settings.  Equation, stepper, driver and chord finder live until
+// program exit.
+void configureFieldManager(
+    G4FieldManager *field_manager, G4MagneticField *field,
+    const FieldSettings& settings);
+
+#endif
@@ -0,0 +1,64 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#include <sstream>
+#include <G4GeometrySampler.hh>
+#include <G4IStore.hh>
+#include <G4GeometryCell.hh>
+#include <G4TransportationManager.hh>
+#include <G4Navigator.hh>
+#include <G4VPhysicalVolume.hh>
+#include <G4LogicalVolume.hh>
+#include "ImportanceBiasing.h"
+#include "Exception.h"
+
+ImportanceBiasing::ImportanceBiasing(const std::string& particle)
+    : G4VPhysicsConstructor("ImportanceBiasing_" + particle),
+      particle(particle)
+{
+}
+
+ImportanceBiasing::~ImportanceBiasing()
+{
+}
+
+void ImportanceBiasing::ConstructProcess()
+{
+    G4VPhysicalVolume *world =
+        G4TransportationManager::GetTransportationManager()
+        ->GetNavigatorForTracking()->GetWorldVolume();
+    if (world == nullptr)
+        pbpl_throw("importance biasing requires a world volume");
+    sampler.reset(new G4GeometrySampler(world, particle));
+    sampler->SetParallel(false);
+    sampler->PrepareImportanceSampling(G4IStore::GetInstance(), 0);
+    sampler->Configure();
+}
+
+static void setCellImportance(
+    G4IStore *store, const G4GeometryCell& cell, double importance)
+{
+    if (store->IsKnown(cell))
+        store->ChangeImportance(importance, cell);
+    else
+        store->AddImportanceGeometryCell(importance, cell);
+}
+
+void setImportance(const G4VPhysicalVolume *physical, double importance)
+{
+    if (importance < 0)
+        pbpl_throw("importance must not be negative");
+    G4IStore *store = G4IStore::GetInstance();
+    // touchable replica number is the copy number of placements
+    if (physical->IsReplicated()) {
+        for (int i=0; i<physical->GetMultiplicity(); ++i)
+            setCellImportance(
+                store, G4GeometryCell(*physical, i), importance);
+    }
+    else
+        setCellImportance(
+            store, G4GeometryCell(*physical, physical->GetCopyNo()),
+            importance);
+    const G4LogicalVolume *logical = physical->GetLogicalVolume();
+    const int n = logical->GetNoDaughters();
+    for (int i=0; i<n; ++i)
+        setImportance(logical->GetDaughter(i), importance);
+}
@@ -0,0 +1,35 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#ifndef IMPORTANCE_BIASING_H
+#define IMPORTANCE_BIASING_H
+
+#include <string>
+#include <memory>
+#include <G4VPhysicsConstructor.hh>
+
+class G4GeometrySampler;
+class G4VPhysicalVolume;
+
+// Geometric importance sampling (mass geometry) of one particle type.
+// Tracks entering a cell of higher importance are split, tracks
+// entering a cell of lower importance are played Russian roulette;
+// track weights are adjusted so tallies remain unbiased.  The sampler
+// is created in ConstructProcess(), once the world volume exists.
+class ImportanceBiasing : public G4VPhysicsConstructor
+{
+public:
+    ImportanceBiasing(const std::string& particle);
+    ~ImportanceBiasing();
+    void ConstructParticle() override { }
+    void ConstructProcess() override;
+private:
+    std::string particle;
+    std::unique_ptr<G4GeometrySampler> sampler;
+};
+
+// Set importance of physical (every copy if replicated or
+// parameterised) and all of its daughters.  Call on the world first,
+// then on nested volumes, so unlisted volumes inherit the importance
+// of their mother.
+void setImportance(const G4VPhysicalVolume *physical, double importance);
+
+#endif
@@ -7,7 +7,15 @@
 #include <G4SystemOfUnits.hh>
 #include <G4Exp.hh>
 #include <G4AutoLock.hh>
+#include <cstring>
+#include <cstdint>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#include <boost/multi_array.hpp>
 #include "ImportedMagneticField.h"
+#include "Exception.h"
 
 #undef H5_USE_BOOST
 #define H5_USE_BOOST
@@ -17,32 +25,265 @@
 namespace
 {
     G4Mutex ImportedMagneticFieldMutex = G4MUTEX_INITIALIZER;
+    const char image_magic[8] = { 'P', 'B', 'P', 'L', 'F', 'L', 'D', '2' };
 }
 
+void FieldAxis::init()
+{
+    const int n = vals.size();
+    x0 = vals.front();
+    x1 = vals.back();
+    last = n - 2;
+    inv_width.resize(n - 1);
+    double min_width = x1 - x0;
+    double max_width = 0.0;
+    for (int i=0; i<n-1; ++i) {
+        const double w = vals[i+1] - vals[i];
+        if (w <= 0.0)
+            pbpl_throw("field grid values must be strictly increasing");
+        inv_width[i] = 1.0 / w;
+        min_width = std::min(min_width, w);
+        max_width = std::max(max_width, w);
+    }
+
+    // grid values are usually stored in single precision
+    uniform = (max_width - min_width) <= 1e-4 * max_width;
+    lut.clear();
+    if (uniform) {
+        inv_h = (n - 1) / (x1 - x0);
+        return;
+    }
+
+    // Buckets no wider than the narrowest cell overlap at most two
+    // cells.  Table size is capped; wider buckets are still correct,
+    // locate() just steps over more than one cell.
+    const int num_buckets = std::min<double>(
+        std::ceil((x1 - x0) / min_width), 16.0 * n);
+    inv_h = num_buckets / (x1 - x0);
+    lut.resize(num_buckets + 1);
+    int j = 0;
+    for (int b=0; b<=num_buckets; ++b) {
+        const double xb = x0 + b / inv_h;
+        while (j < last && xb >= vals[j+1])
+            ++j;
+        lut[b] = j;
+    }
+}
+
+
 void ImportedMagneticField::loadField(const std::string& filename)
 {
     G4AutoLock lock(&ImportedMagneticFieldMutex);
 
-    HighFive::File fin(filename, HighFive::File::ReadOnly);
-    const char *dset_names[] = { "/xvals", "/yvals", "/zvals" };
     for (unsigned i=0; i<3; ++i) {
-        xvals[i] = H5Easy::load<std::vector<float> >(fin, dset_names[i]);
-        for (float &x : xvals[i]) {
+        mirror[i] = false;
+        for (unsigned j=0; j<3; ++j)
+            mirror_sign[i][j] = 1.0;
+    }
+
+    char magic[sizeof(image_magic)] = { 0 };
+    std::ifstream(filename, std::ios::binary).read(magic, sizeof(magic));
+    if (std::memcmp(magic, image_magic, sizeof(magic)) == 0) {
+        loadImage(filename);
+    } else if (std::memcmp(magic, image_magic, sizeof(magic)-1) == 0) {
+        pbpl_throw("unsupported field image version '" + filename + "'");
+    } else {
+        loadHDF5(filename);
+    }
+
+    for (unsigned i=0; i<3; ++i) {
+        for (double &x : axes[i].vals) {
             x *= meter;
         }
-        x0[i] = xvals[i].front();
-        x1[i] = xvals[i].back();
-        N[i] = xvals[i].size();
-        dx[i] = (x1[i] - x0[i]) / (N[i] - 1);
+        axes[i].init();
+        if (mirror[i] && axes[i].x0 < 0.0)
+            pbpl_throw("mirrored field axis must start at 0");
+        x0[i] = axes[i].x0;
+        x1[i] = axes[i].x1;
+        N[i] = axes[i].vals.size();
     }
+    cache.idx[0] = -1;
+    scaling_factor = 1.0;
+    cubic = false;
+}
 
+
+void ImportedMagneticField::setInterpolation(const std::string& mode)
+{
+    if (mode == "linear") {
+        cubic = false;
+        return;
+    }
+    if (mode != "cubic")
+        pbpl_throw("unknown interpolation '" + mode + "'");
+    for (unsigned i=0; i<3; ++i) {
+        if (!axes[i].uniform)
+            pbpl_throw("cubic interpolation requires a uniform grid");
+        if (N[i] < 4)
+            pbpl_throw("cubic interpolation requires 4 or more points per axis");
+    }
+    cubic = true;
+}
+
+
+// Catmull-Rom (cubic convolution) interpolation over the 4x4x4 samples
+// around x.  Samples beyond the grid are linearly extrapolated, or
+// mirrored (with component signs) at mirror planes, and folded into
+// per-component weights of the 4 nearest in-grid samples of each axis.
+void ImportedMagneticField::evalCubic(const double x[3], double *result) const
+{
+    int base[3];
+    double W[3][3][4];
+    for (unsigned a=0; a<3; ++a) {
+        const int n = N[a];
+        const double u = (x[a] - x0[a]) * axes[a].inv_h;
+        int i = static_cast<int>(u);
+        if (i > n - 2)
+            i = n - 2;
+        const double t = u - i;
+        const double w[4] = {
+            0.5 * (-t*t*t + 2*t*t - t),
+            0.5 * (3*t*t*t - 5*t*t + 2),
+            0.5 * (-3*t*t*t + 4*t*t + t),
+            0.5 * (t*t*t - t*t) };
+        const int b = std::max(0, std::min(i - 1, n - 4));
+        base[a] = b;
+        for (unsigned comp=0; comp<3; ++comp) {
+            double *Wc = W[a][comp];
+            Wc[0] = Wc[1] = Wc[2] = Wc[3] = 0.0;
+            for (int k=0; k<4; ++k) {
+                const int j = i - 1 + k;
+                if (j < 0) {
+                    if (mirror[a])
+                        Wc[1-b] += mirror_sign[a][comp] * w[k];
+                    else {
+                        Wc[0-b] += 2*w[k];
+                        Wc[1-b] -= w[k];
+                    }
+                }
+                else if (j > n - 1) {
+                    Wc[n-1-b] += 2*w[k];
+                    Wc[n-2-b] -= w[k];
+                }
+                else
+                    Wc[j-b] += w[k];
+            }
+        }
+    }
+    for (int i=0; i<4; ++i) {
+        for (int j=0; j<4; ++j) {
+            const float *p = at(base[0]+i, base[1]+j, base[2]);
+            for (unsigned comp=0; comp<3; ++comp) {
+                const double wxy = W[0][comp][i] * W[1][comp][j];
+                double sum = 0.0;
+                for (int k=0; k<4; ++k)
+                    sum += W[2][comp][k] * p[3*k+comp];
+                result[comp] += wxy * sum;
+            }
+        }
+    }
+}
+
+
+void ImportedMagneticField::loadHDF5(const std::string& filename)
+{
+    HighFive::File fin(filename, HighFive::File::ReadOnly);
+    const char *dset_names[] = { "/xvals", "/yvals", "/zvals" };
+    for (unsigned i=0; i<3; ++i)
+        axes[i].vals = H5Easy::load<std::vector<double> >(
+            fin, dset_names[i]);
+
+    // Optional mirror symmetry (see convert_field --mirror):
+    //   mirror[3]: nonzero if field is stored for x[i]>=0 only
+    //   mirror_sign[3][3]: sign of component j at -x[i]
+    if (fin.hasAttribute("mirror")) {
+        std::vector<int> m;
+        std::vector<std::vector<int> > m_sign;
+        fin.getAttribute("mirror").read(m);
+        fin.getAttribute("mirror_sign").read(m_sign);
+        for (unsigned i=0; i<3; ++i) {
+            mirror[i] = m[i] != 0;
+            for (unsigned j=0; j<3; ++j)
+                mirror_sign[i][j] = m_sign[i][j];
+        }
+    }
+
+    // B_field is stored as [component][ix][iy][iz].  Interleave
+    // components so that each grid point is one 3-vector.  Components
+    // that are identically zero may be omitted, in which case the
+    // 'components' attribute lists those stored.
     HighFive::DataSet dset = fin.getDataSet("/B_field");
-    field.resize(dset.getSpace().getDimensions());
-    dset.read(field);
-    for (unsigned i=0; i<field.num_elements(); ++i) {
-        field.data()[i] *= tesla;
+    boost::multi_array<float, 4> raw(dset.getSpace().getDimensions());
+    dset.read(raw);
+    std::vector<int> components { 0, 1, 2 };
+    if (dset.hasAttribute("components"))
+        dset.getAttribute("components").read(components);
+    if (components.size() != raw.shape()[0])
+        pbpl_throw("B_field does not match its 'components' attribute");
+    const size_t n[3] = {
+        axes[0].vals.size(), axes[1].vals.size(), axes[2].vals.size() };
+    owned_field.assign(3*n[0]*n[1]*n[2], 0.0f);
+    for (size_t j=0; j<components.size(); ++j) {
+        float *p = owned_field.data() + components[j];
+        for (size_t ix=0; ix<n[0]; ++ix)
+            for (size_t iy=0; iy<n[1]; ++iy)
+                for (size_t iz=0; iz<n[2]; ++iz, p+=3)
+                    *p = raw[j][ix][iy][iz];
     }
-    scaling_factor = 1.0;
+    field = owned_field.data();
+    mapping.reset();
+}
+
+
+// Field image layout (native byte order, see convert_field.write_image):
+//   char     magic[8]        "PBPLFLD2"
+//   uint64   N[3]
+//   int8     mirror[3]
+//   int8     mirror_sign[3][3]
+//   int8     padding[4]
+//   float64  xvals[N[0]], yvals[N[1]], zvals[N[2]]   (meter)
+//   (zero padding to a multiple of 64 bytes)
+//   float32  B[N[0]][N[1]][N[2]][3]                  (tesla)
+//
+// The image is mapped read-only and shared, so every process on a
+// node that maps the same file (e.g., in /dev/shm) shares one copy
+// through the page cache.
+void ImportedMagneticField::loadImage(const std::string& filename)
+{
+    int fd = open(filename.c_str(), O_RDONLY);
+    if (fd < 0)
+        pbpl_throw("could not open field image '" + filename + "'");
+    struct stat st;
+    fstat(fd, &st);
+    const size_t size = st.st_size;
+    void *addr = mmap(nullptr, size, PROT_READ, MAP_SHARED, fd, 0);
+    close(fd);
+    if (addr == MAP_FAILED)
+        pbpl_throw("could not map field image '" + filename + "'");
+    mapping = std::shared_ptr<const void>(
+        addr, [size](const void *p) { munmap(const_cast<void*>(p), size); });
+
+    const char *p = static_cast<const char*>(addr);
+    uint64_t n[3];
+    std::memcpy(n, p + sizeof(image_magic), sizeof(n));
+    size_t offset = sizeof(image_magic) + sizeof(n);
+    const int8_t *sym = reinterpret_cast<const int8_t*>(p + offset);
+    for (unsigned i=0; i<3; ++i) {
+        mirror[i] = sym[i] != 0;
+        for (unsigned j=0; j<3; ++j)
+            mirror_sign[i][j] = sym[3 + 3*i + j];
+    }
+    offset += 16;
+    for (unsigned i=0; i<3; ++i) {
+        const double *v = reinterpret_cast<const double*>(p + offset);
+        axes[i].vals.assign(v, v + n[i]);
+        offset += n[i] * sizeof(double);
+    }
+    offset = (offset + 63) / 64 * 64;
+    if (offset + 3*n[0]*n[1]*n[2]*sizeof(float) != size)
+        pbpl_throw("truncated field image '" + filename + "'");
+    field = reinterpret_cast<const float*>(p + offset);
+    owned_field.clear();
 }
 
 
@@ -56,20 +297,65 @@ std::vector<double> ImportedMagneticField::eval(
 }
 
 
+// Evaluate field at n points.  x and B are [n][3] arrays.  Safe to
+// call concurrently: the cell cache is local to the call.
+void ImportedMagneticField::evalArray(
+    const double *x, double *B, size_t n) const
+{
+    CellCache local_cache;
+    double point[4] = { 0.0, 0.0, 0.0, 0.0 };
+    double result[6];
+    for (size_t i=0; i<n; ++i) {
+        for (unsigned j=0; j<3; ++j)
+            point[j] = x[3*i+j];
+        evaluate(point, result, local_cache);
+        for (unsigned j=0; j<3; ++j)
+            B[3*i+j] = result[j];
+    }
+}
+
+
 std::string ImportedMagneticField::dumpInfo() const
 {
     std::ostringstream oss;
-    const auto shape = field.shape();
     for (unsigned i=0; i<3; ++i) {
         oss << "index=" << i << ": "
-            << shape[1+i] << ' '
+            << N[i] << ' '
             << x0[i] << ' '
-            << x1[i] << '\n';
+            << x1[i]
+            << (axes[i].uniform ? " uniform" : " non-uniform") << '\n';
     }
     return oss.str();
 }
 
+void ImportedMagneticField::loadCell(
+    const int idx[3], CellCache& cell) const
+{
+    const float *p000 = at(idx[0],   idx[1],   idx[2]);
+    const float *p010 = at(idx[0],   idx[1]+1, idx[2]);
+    const float *p100 = at(idx[0]+1, idx[1],   idx[2]);
+    const float *p110 = at(idx[0]+1, idx[1]+1, idx[2]);
+    for (unsigned i=0; i<3; ++i) {
+        cell.c[0][i] = p000[i];
+        cell.c[1][i] = p000[3+i];
+        cell.c[2][i] = p010[i];
+        cell.c[3][i] = p010[3+i];
+        cell.c[4][i] = p100[i];
+        cell.c[5][i] = p100[3+i];
+        cell.c[6][i] = p110[i];
+        cell.c[7][i] = p110[3+i];
+    }
+    for (unsigned i=0; i<3; ++i)
+        cell.idx[i] = idx[i];
+}
+
 void ImportedMagneticField::GetFieldValue(const double point[4], double *result) const
+{
+    evaluate(point, result, cache);
+}
+
+void ImportedMagneticField::evaluate(
+    const double point[4], double *result, CellCache& cell) const
 {
     result[0] = 0.0;
     result[1] = 0.0;
@@ -80,43 +366,57 @@ void ImportedMagneticField::GetFieldValue(const double point[4], double *result)
     double x[3] = { point[0], point[1], point[2] };
     //double t = point[3];
 
+    // map point into stored region of mirror-symmetric fields
+    double sign[3] = { 1.0, 1.0, 1.0 };
+    for (unsigned i=0; i<3; ++i) {
+        if (mirror[i] && x[i] < 0.0) {
+            x[i] = -x[i];
+            for (unsigned j=0; j<3; ++j)
+                sign[j] *= mirror_sign[i][j];
+        }
+    }
+
     if (x[0]>=x0[0] && x[0]<=x1[0] &&
         x[1]>=x0[1] && x[1]<=x1[1] &&
         x[2]>=x0[2] && x[2]<=x1[2]) {
 
+        if (cubic) {
+            evalCubic(x, result);
+            for (unsigned i=0; i<3; ++i)
+                result[i] *= sign[i];
+            for (unsigned i=0; i<6; ++i)
+                result[i] *= scaling_factor * tesla;
+            return;
+        }
+
         int idx[3];
         double xd[3];
-        for (unsigned i=0; i<3; ++i) {
-            double temp;
-            xd[i] = std::modf((x[i]-x0[i])/dx[i], &temp);
-            idx[i] = static_cast<int>(std::floor(temp));
-        }
+        for (unsigned i=0; i<3; ++i)
+            idx[i] = axes[i].locate(x[i], xd[i]);
 
-        // TODO: Use cached cXXXX values if idx[i] values unchanged
-        //       from previous evaluation.  Make sure optimization
-        //       actually performs better.
+        // Successive steps of a track usually stay within one cell,
+        // so corner values of the previous cell are reused.
+        if (idx[0] != cell.idx[0] ||
+            idx[1] != cell.idx[1] ||
+            idx[2] != cell.idx[2])
+            loadCell(idx, cell);
 
-        for (unsigned i=0; i<3; ++i) {
-            const float c000 = field[i][idx[0]  ][idx[1]  ][idx[2]  ];
-            const float c001 = field[i][idx[0]  ][idx[1]  ][idx[2]+1];
-            const float c010 = field[i][idx[0]  ][idx[1]+1][idx[2]  ];
-            const float c011 = field[i][idx[0]  ][idx[1]+1][idx[2]+1];
-            const float c100 = field[i][idx[0]+1][idx[1]  ][idx[2]  ];
-            const float c101 = field[i][idx[0]+1][idx[1]  ][idx[2]+1];
-            const float c110 = field[i][idx[0]+1][idx[1]+1][idx[2]  ];
-            const float c111 = field[i][idx[0]+1][idx[1]+1][idx[2]+1];
-
-            result[i] = (
-                c000*(1-xd[0])*(1-xd[1])*(1-xd[2]) +
-                c001*(1-xd[0])*(1-xd[1])*xd[2]  +
-                c010*(1-xd[0])*xd[1]*(1-xd[2]) +
-                c011*(1-xd[0])*xd[1]*xd[2]  +
-                c100*xd[0]*(1-xd[1])*(1-xd[2]) +
-                c101*xd[0]*(1-xd[1])*xd[2] +
-                c110*xd[0]*xd[1]*(1-xd[2]) +
-                c111*xd[0]*xd[1]*xd[2]);
-        }
+        const double w[8] = {
+            (1-xd[0])*(1-xd[1])*(1-xd[2]),
+            (1-xd[0])*(1-xd[1])*xd[2],
+            (1-xd[0])*xd[1]*(1-xd[2]),
+            (1-xd[0])*xd[1]*xd[2],
+            xd[0]*(1-xd[1])*(1-xd[2]),
+            xd[0]*(1-xd[1])*xd[2],
+            xd[0]*xd[1]*(1-xd[2]),
+            xd[0]*xd[1]*xd[2] };
+
+        for (unsigned j=0; j<8; ++j)
+            for (unsigned i=0; i<3; ++i)
+                result[i] += w[j] * cell.c[j][i];
+        for (unsigned i=0; i<3; ++i)
+            result[i] *= sign[i];
     }
     for (unsigned i=0; i<6; ++i)
-        result[i] *= scaling_factor;
+        result[i] *= scaling_factor * tesla;
 }
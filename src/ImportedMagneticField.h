@@ -7,7 +7,40 @@
 #include <fstream>
 #include <vector>
 #include <string>
-#include <boost/multi_array.hpp>
+#include <memory>
+
+// Grid axis of a rectilinear (possibly non-uniform) field map.  Cells
+// of non-uniform axes are located through a lookup table over uniform
+// buckets no wider than the narrowest cell, so locate() is O(1).
+struct FieldAxis
+{
+    std::vector<double> vals;
+    std::vector<double> inv_width;
+    std::vector<int> lut;
+    double x0, x1, inv_h;
+    int last;
+    bool uniform;
+
+    void init();
+    // Index of cell containing x (x0 <= x <= x1) and fractional
+    // position xd within that cell.
+    int locate(double x, double& xd) const {
+        if (uniform) {
+            const double u = (x - x0) * inv_h;
+            int i = static_cast<int>(u);
+            // point on upper boundary belongs to last cell
+            if (i > last)
+                i = last;
+            xd = u - i;
+            return i;
+        }
+        int i = lut[static_cast<int>((x - x0) * inv_h)];
+        while (i < last && x >= vals[i+1])
+            ++i;
+        xd = (x - vals[i]) * inv_width[i];
+        return i;
+    }
+};
 
 class ImportedMagneticField : public G4MagneticField
 {
@@ -19,15 +52,47 @@ public:
     void loadField(const std::string& filename);
     void GetFieldValue(const double Point[4], double *field) const;
     std::vector<double> eval(double x, double y, double z) const;
+    void evalArray(const double *x, double *B, size_t n) const;
     std::string dumpInfo() const;
     void setScalingFactor(float val) { scaling_factor = val; }
+    void setInterpolation(const std::string& mode);
 private:
-    typedef boost::multi_array<float, 4> field_type;
-    field_type field;
-    std::vector<float> xvals[3];
-    float x0[3], x1[3], dx[3];
+    void loadHDF5(const std::string& filename);
+    void loadImage(const std::string& filename);
+    void evalCubic(const double x[3], double *result) const;
+
+    // field values (tesla) interleaved as [ix][iy][iz][component], so
+    // the 8 corners of a cell are 4 pairs of adjacent (iz, iz+1)
+    // 3-vectors.  Data is either owned (HDF5 files) or a read-only
+    // shared mapping of a field image.
+    const float *field = nullptr;
+    std::vector<float> owned_field;
+    std::shared_ptr<const void> mapping;
+    const float *at(int ix, int iy, int iz) const {
+        return field + 3*((size_t(ix)*N[1] + iy)*N[2] + iz);
+    }
+
+    FieldAxis axes[3];
+    double x0[3], x1[3];
+    bool mirror[3];
+    double mirror_sign[3][3];
     unsigned N[3];
     float scaling_factor;
+    bool cubic = false;
+
+    // Corner values of the most recently visited cell.  The member
+    // cache is written by GetFieldValue() and eval(), so these must
+    // not be called concurrently on one instance (Geant4 gives each
+    // worker thread its own field).  evalArray() uses a call-local
+    // cache and may run concurrently (it releases the GIL).
+    struct CellCache {
+        int idx[3] = { -1, -1, -1 };
+        float c[8][3];
+    };
+    mutable CellCache cache;
+    void loadCell(const int idx[3], CellCache& cell) const;
+    void evaluate(
+        const double point[4], double *result, CellCache& cell) const;
 };
 
 #endif
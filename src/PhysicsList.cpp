@@ -1,12 +1,21 @@
 // -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
 #include <iostream>
+#include <sstream>
 #include "PhysicsList.h"
 #include "Particles.h"
 #include "PhysicsListEMstd.h"
+#include "ImportanceBiasing.h"
+#include "Exception.h"
 #include <G4SystemOfUnits.hh>
 #include <G4EmStandardPhysics_option4.hh>
 #include <G4OpticalPhysics.hh>
+#include <G4PhysicsConstructorRegistry.hh>
+#include <G4BuilderType.hh>
 
+// Particles and PhysicsListEMstd are registered by default.  Further
+// constructors are added with registerConstructor(), which replaces
+// PhysicsListEMstd if another EM constructor is requested (see
+// mc.create_physics_list).
 PhysicsList::PhysicsList() : G4VModularPhysicsList()
 {
     // default cut value  (1.0mm)
@@ -17,10 +26,7 @@ PhysicsList::PhysicsList() : G4VModularPhysicsList()
     RegisterPhysics(new Particles);
 
     // EM Physics
-//   RegisterPhysics(new G4EmStandardPhysics_option4);
     RegisterPhysics(new PhysicsListEMstd);
-    G4OpticalPhysics* op = new G4OpticalPhysics;
-    RegisterPhysics(op);
 }
 
 
@@ -35,3 +41,37 @@ void PhysicsList::SetCuts()
     // the default cut value for all particle types
     SetCutsWithDefault();
 }
+
+
+// Register physics constructor by class name: PhysicsListEMstd, or
+// any constructor known to G4PhysicsConstructorRegistry (e.g.,
+// G4EmStandardPhysics_option4, G4OpticalPhysics, G4DecayPhysics).
+// EM constructors replace the registered EM physics.
+void PhysicsList::registerConstructor(const std::string& name)
+{
+    G4VPhysicsConstructor *constructor;
+    if (name == "PhysicsListEMstd")
+        constructor = new PhysicsListEMstd;
+    else if (name == "G4EmStandardPhysics_option4")
+        constructor = new G4EmStandardPhysics_option4;
+    else if (name == "G4OpticalPhysics")
+        constructor = new G4OpticalPhysics;
+    else {
+        auto registry = G4PhysicsConstructorRegistry::Instance();
+        if (!registry->IsKnownPhysicsConstructor(name))
+            pbpl_throw("unknown physics constructor '" + name + "'");
+        constructor = registry->GetPhysicsConstructor(name);
+    }
+    if (constructor->GetPhysicsType() == bElectromagnetic)
+        ReplacePhysics(constructor);
+    else
+        RegisterPhysics(constructor);
+}
+
+
+// Geometric importance sampling of particle.  Cell importances are set
+// with setImportance() after the run manager is initialized.
+void PhysicsList::registerImportanceBiasing(const std::string& particle)
+{
+    RegisterPhysics(new ImportanceBiasing(particle));
+}
@@ -4,6 +4,7 @@
 
 #include <G4VModularPhysicsList.hh>
 #include <globals.hh>
+#include <string>
 
 class PhysicsList: public G4VModularPhysicsList
 {
@@ -11,6 +12,8 @@ public:
     PhysicsList();
     ~PhysicsList();
     virtual void SetCuts();
+    void registerConstructor(const std::string& name);
+    void registerImportanceBiasing(const std::string& particle);
 };
 
 #endif
@@ -2,6 +2,7 @@
 #include "PhysicsListEMstd.h"
 
 #include <G4SystemOfUnits.hh>
+#include <G4BuilderType.hh>
 #include <G4ProcessManager.hh>
 #include <G4ParticleDefinition.hh>
 
@@ -27,7 +28,8 @@
 #include <G4LowEPPolarizedComptonModel.hh>
 
 
-PhysicsListEMstd::PhysicsListEMstd() : G4VPhysicsConstructor("EM-std")
+PhysicsListEMstd::PhysicsListEMstd()
+    : G4VPhysicsConstructor("EM-std", bElectromagnetic)
 {
 }
 
@@ -0,0 +1,28 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#include <sstream>
+#include <G4Region.hh>
+#include <G4ProductionCuts.hh>
+#include <G4LogicalVolume.hh>
+#include "Regions.h"
+#include "Exception.h"
+
+G4Region* createRegion(
+    const std::string& name, const std::vector<G4LogicalVolume*>& volumes,
+    const std::map<std::string, double>& cuts, double default_cut)
+{
+    auto production_cuts = new G4ProductionCuts;
+    production_cuts->SetProductionCut(default_cut);
+    for (const auto& x : cuts) {
+        if (x.first != "gamma" && x.first != "e-" &&
+            x.first != "e+" && x.first != "proton")
+            pbpl_throw("no production cut for particle '" + x.first + "'");
+        production_cuts->SetProductionCut(x.second, x.first);
+    }
+    auto region = new G4Region(name);
+    region->SetProductionCuts(production_cuts);
+    for (G4LogicalVolume *logical : volumes) {
+        logical->SetRegion(region);
+        region->AddRootLogicalVolume(logical);
+    }
+    return region;
+}
@@ -0,0 +1,20 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#ifndef REGIONS_H
+#define REGIONS_H
+
+#include <string>
+#include <vector>
+#include <map>
+
+class G4Region;
+class G4LogicalVolume;
+
+// Create region with its own production cuts (particle name -> range
+// cut; particles not listed keep the default cut).  volumes become
+// root logical volumes of the region, so their daughters belong to it
+// too.
+G4Region* createRegion(
+    const std::string& name, const std::vector<G4LogicalVolume*>& volumes,
+    const std::map<std::string, double>& cuts, double default_cut);
+
+#endif
@@ -0,0 +1,93 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#include <fstream>
+#include <sstream>
+#include <vector>
+#include <cstring>
+#include <cstdint>
+#include <G4TessellatedSolid.hh>
+#include <G4TriangularFacet.hh>
+#include <G4QuadrangularFacet.hh>
+#include "SolidCache.h"
+#include "Exception.h"
+
+// Cache file layout (native byte order):
+//   char     magic[8] = "PBPLMSH1"
+//   uint64   num_facets
+//   uint8    num_vertices[num_facets]   (3 or 4)
+//   (zero padding to multiple of 8 bytes)
+//   float64  vertices[sum(num_vertices)][3]   (absolute, internal units)
+static const char cache_magic[8] = { 'P','B','P','L','M','S','H','1' };
+
+void writeSolidCache(const G4VSolid *solid, const std::string& filename)
+{
+    auto tess = dynamic_cast<const G4TessellatedSolid*>(solid);
+    if (tess == nullptr)
+        pbpl_throw("solid '" + solid->GetName() + "' is not tessellated");
+    const uint64_t num_facets = tess->GetNumberOfFacets();
+    std::vector<uint8_t> num_vertices(num_facets);
+    std::vector<double> vertices;
+    for (uint64_t i=0; i<num_facets; ++i) {
+        const G4VFacet *facet = tess->GetFacet(i);
+        num_vertices[i] = facet->GetNumberOfVertices();
+        for (int j=0; j<num_vertices[i]; ++j) {
+            const G4ThreeVector v = facet->GetVertex(j);
+            vertices.insert(vertices.end(), { v.x(), v.y(), v.z() });
+        }
+    }
+
+    std::ofstream fout(filename, std::ios::binary);
+    fout.write(cache_magic, sizeof(cache_magic));
+    fout.write(reinterpret_cast<const char*>(&num_facets), sizeof(num_facets));
+    fout.write(reinterpret_cast<const char*>(num_vertices.data()), num_facets);
+    const char pad[8] = { 0 };
+    fout.write(pad, (8 - num_facets % 8) % 8);
+    fout.write(reinterpret_cast<const char*>(vertices.data()),
+               vertices.size() * sizeof(double));
+    if (!fout)
+        pbpl_throw("could not write '" + filename + "'");
+}
+
+G4VSolid* readSolidCache(
+    const std::string& filename, const std::string& name, int max_voxels)
+{
+    std::ifstream fin(filename, std::ios::binary);
+    char magic[sizeof(cache_magic)];
+    uint64_t num_facets = 0;
+    fin.read(magic, sizeof(magic));
+    fin.read(reinterpret_cast<char*>(&num_facets), sizeof(num_facets));
+    if (!fin || std::memcmp(magic, cache_magic, sizeof(magic)) != 0)
+        pbpl_throw("'" + filename + "' is not a solid cache");
+    std::vector<uint8_t> num_vertices(num_facets);
+    fin.read(reinterpret_cast<char*>(num_vertices.data()), num_facets);
+    fin.ignore((8 - num_facets % 8) % 8);
+    size_t total = 0;
+    for (auto n : num_vertices)
+        total += n;
+    std::vector<double> vertices(3*total);
+    fin.read(reinterpret_cast<char*>(vertices.data()),
+             vertices.size() * sizeof(double));
+    if (!fin)
+        pbpl_throw("truncated solid cache '" + filename + "'");
+
+    auto result = new G4TessellatedSolid(name);
+    const double *v = vertices.data();
+    auto vertex = [&v](int j) {
+        return G4ThreeVector(v[3*j], v[3*j+1], v[3*j+2]);
+    };
+    for (auto n : num_vertices) {
+        if (n == 3)
+            result->AddFacet(new G4TriangularFacet(
+                vertex(0), vertex(1), vertex(2), ABSOLUTE));
+        else if (n == 4)
+            result->AddFacet(new G4QuadrangularFacet(
+                vertex(0), vertex(1), vertex(2), vertex(3), ABSOLUTE));
+        else
+            pbpl_throw("invalid facet in solid cache '" + filename + "'");
+        v += 3*n;
+    }
+    // voxelization happens when the solid is closed
+    if (max_voxels > 0)
+        result->SetMaxVoxels(max_voxels);
+    result->SetSolidClosed(true);
+    return result;
+}
@@ -0,0 +1,17 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#ifndef SOLID_CACHE_H
+#define SOLID_CACHE_H
+
+#include <string>
+
+class G4VSolid;
+
+// Facets of a G4TessellatedSolid in a compact binary file, so that
+// meshes parsed once by CADMesh/assimp load directly on later runs.
+// max_voxels > 0 overrides the voxel budget of the solid's navigation
+// voxelization (G4TessellatedSolid::SetMaxVoxels).
+void writeSolidCache(const G4VSolid *solid, const std::string& filename);
+G4VSolid* readSolidCache(
+    const std::string& filename, const std::string& name, int max_voxels);
+
+#endif
@@ -0,0 +1,150 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#include <sstream>
+#include <algorithm>
+#include <G4Track.hh>
+#include <G4ParticleTable.hh>
+#include <G4ParticleDefinition.hh>
+#include <G4StackManager.hh>
+#include <G4VProcess.hh>
+#include "StackingAction.h"
+#include "Exception.h"
+
+StackingAction::StackingAction()
+    : use_region(false), max_generation(-1), max_stage(0),
+      stacks_ready(false)
+{
+}
+
+const G4ParticleDefinition* StackingAction::findParticle(
+    const std::string& particle) const
+{
+    auto result = G4ParticleTable::GetParticleTable()->FindParticle(particle);
+    if (result == nullptr)
+        pbpl_throw("unknown particle '" + particle + "'");
+    return result;
+}
+
+void StackingAction::setThreshold(const std::string& particle, double energy)
+{
+    thresholds[findParticle(particle)] = energy;
+}
+
+void StackingAction::setStage(const std::string& particle, int stage)
+{
+    // fWaiting_1 ... fWaiting_10 are additional waiting stacks
+    if (stage < 0 || stage > 11)
+        pbpl_throw("stage must be between 0 and 11");
+    stages[findParticle(particle)] = stage;
+    max_stage = std::max(max_stage, stage);
+    stacks_ready = false;
+}
+
+void StackingAction::setRegionOfInterest(
+    const G4ThreeVector& lower, const G4ThreeVector& upper)
+{
+    use_region = true;
+    region_lower = lower;
+    region_upper = upper;
+}
+
+void StackingAction::PrepareNewEvent()
+{
+    generation.clear();
+    if (!stacks_ready) {
+        if (max_stage > 1)
+            stackManager->SetNumberOfAdditionalWaitingStacks(max_stage - 1);
+        stacks_ready = true;
+    }
+}
+
+StackingAction::KillReason StackingAction::killReason(
+    const G4Track *track, int gen) const
+{
+    auto threshold = thresholds.find(track->GetDefinition());
+    if (threshold != thresholds.end() &&
+        track->GetKineticEnergy() < threshold->second)
+        return kEnergy;
+    if (max_generation >= 0 && gen > max_generation)
+        return kGeneration;
+    if (use_region) {
+        const G4ThreeVector& x = track->GetPosition();
+        if (x.x() < region_lower.x() || x.x() > region_upper.x() ||
+            x.y() < region_lower.y() || x.y() > region_upper.y() ||
+            x.z() < region_lower.z() || x.z() > region_upper.z())
+            return kRegion;
+    }
+    return kNumReasons;
+}
+
+G4ClassificationOfNewTrack StackingAction::ClassifyNewTrack(
+    const G4Track *track)
+{
+    const G4ParticleDefinition *particle = track->GetDefinition();
+    int gen = 0;
+    if (track->GetParentID() != 0) {
+        auto parent = generation.find(track->GetParentID());
+        gen = (parent == generation.end() ? 0 : parent->second);
+        // Importance-split clones continue the track they were split
+        // from, which passed the limits when it was created.  They
+        // keep its generation and are never killed here, since that
+        // would drop their share of the weight.
+        const G4VProcess *creator = track->GetCreatorProcess();
+        const bool clone = creator != nullptr &&
+            creator->GetProcessName() == "ImportanceProcess";
+        if (!clone)
+            ++gen;
+
+        const KillReason reason =
+            clone ? kNumReasons : killReason(track, gen);
+        if (reason != kNumReasons) {
+            Tally& tally = killed[particle->GetParticleName()];
+            // weighted, so tallies stay unbiased under importance biasing
+            tally.count[reason] += track->GetWeight();
+            tally.energy[reason] +=
+                track->GetWeight()*track->GetKineticEnergy();
+            return fKill;
+        }
+    }
+    generation[track->GetTrackID()] = gen;
+
+    auto stage = stages.find(particle);
+    if (stage == stages.end() || stage->second == 0)
+        return fUrgent;
+    if (stage->second == 1)
+        return fWaiting;
+    return G4ClassificationOfNewTrack(fWaiting_1 + stage->second - 2);
+}
+
+std::vector<std::string> StackingAction::killReasons()
+{
+    return { "Energy", "Region", "Generation" };
+}
+
+std::vector<std::string> StackingAction::getKilledParticles() const
+{
+    std::vector<std::string> result;
+    for (const auto& x : killed)
+        result.push_back(x.first);
+    return result;
+}
+
+std::vector<double> StackingAction::getKillCounts(
+    const std::string& particle) const
+{
+    std::vector<double> result(kNumReasons, 0.0);
+    auto tally = killed.find(particle);
+    if (tally != killed.end())
+        result.assign(tally->second.count, tally->second.count + kNumReasons);
+    return result;
+}
+
+std::vector<double> StackingAction::getKilledEnergy(
+    const std::string& particle) const
+{
+    std::vector<double> result(kNumReasons, 0.0);
+    auto tally = killed.find(particle);
+    if (tally != killed.end())
+        result.assign(
+            tally->second.energy, tally->second.energy + kNumReasons);
+    return result;
+}
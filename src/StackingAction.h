@@ -0,0 +1,67 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#ifndef STACKING_ACTION_H
+#define STACKING_ACTION_H
+
+#include <string>
+#include <vector>
+#include <map>
+#include <unordered_map>
+#include <G4UserStackingAction.hh>
+#include <G4ThreeVector.hh>
+
+// Classify new tracks without a Python callback per track.
+// Secondaries are killed below a per-particle kinetic energy
+// threshold, when created outside the region of interest (world
+// frame), or when deeper than the maximum generation (primaries are
+// generation 0).  Primaries are never killed.  Surviving particles
+// with stage > 0 are deferred to waiting stack 'stage', so they are
+// tracked only after all lower stages are exhausted.  Kill counts
+// and killed kinetic energy are summed over track weights.  The limits
+// apply before importance splitting: clones (secondaries of the split
+// track, created by ImportanceProcess) keep the generation of the
+// track they were split from and are never killed, so no weight is
+// lost when stacking limits and importance biasing are combined.
+class StackingAction : public G4UserStackingAction
+{
+public:
+    enum KillReason { kEnergy, kRegion, kGeneration, kNumReasons };
+
+    StackingAction();
+    G4ClassificationOfNewTrack ClassifyNewTrack(
+        const G4Track *track) override;
+    void PrepareNewEvent() override;
+
+    void setThreshold(const std::string& particle, double energy);
+    void setStage(const std::string& particle, int stage);
+    void setRegionOfInterest(
+        const G4ThreeVector& lower, const G4ThreeVector& upper);
+    void setMaxGeneration(int n) { max_generation = n; }
+
+    static std::vector<std::string> killReasons();
+    std::vector<std::string> getKilledParticles() const;
+    std::vector<double> getKillCounts(const std::string& particle) const;
+    std::vector<double> getKilledEnergy(const std::string& particle) const;
+    void resetCounts() { killed.clear(); }
+
+private:
+    struct Tally {
+        double count[kNumReasons] = { };
+        double energy[kNumReasons] = { };
+    };
+    std::unordered_map<const G4ParticleDefinition*, double> thresholds;
+    std::unordered_map<const G4ParticleDefinition*, int> stages;
+    std::unordered_map<int, int> generation;
+    std::map<std::string, Tally> killed;
+    bool use_region;
+    G4ThreeVector region_lower;
+    G4ThreeVector region_upper;
+    int max_generation;
+    int max_stage;
+    bool stacks_ready;
+
+    const G4ParticleDefinition* findParticle(
+        const std::string& particle) const;
+    KillReason killReason(const G4Track *track, int gen) const;
+};
+
+#endif
@@ -0,0 +1,49 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#include <sstream>
+#include <limits>
+#include <G4Box.hh>
+#include <G4LogicalVolume.hh>
+#include <G4AssemblyVolume.hh>
+#include <CADMesh.hh>
+#include "TetrahedralVolume.h"
+#include "Exception.h"
+
+TetrahedralVolume::TetrahedralVolume(
+    const std::string& filename, const std::string& name,
+    G4Material *material, G4Material *envelope_material, double quality)
+{
+    mesh = std::make_shared<CADMesh::TetrahedralMesh>(
+        const_cast<char*>(filename.c_str()));
+    mesh->SetMaterial(material);
+    if (quality > 0.0)
+        mesh->SetQuality(quality);
+    G4AssemblyVolume *assembly = mesh->GetAssembly();
+    if (assembly == nullptr || assembly->TotalTriplets() == 0)
+        pbpl_throw("could not tetrahedralize '" + filename + "'");
+
+    const double inf = std::numeric_limits<double>::infinity();
+    G4ThreeVector lo(inf, inf, inf), hi(-inf, -inf, -inf);
+    auto triplet = assembly->GetTripletsIterator();
+    for (unsigned i=0; i<assembly->TotalTriplets(); ++i, ++triplet) {
+        G4LogicalVolume *logical = triplet->GetVolume();
+        G4ThreeVector pmin, pmax;
+        logical->GetSolid()->BoundingLimits(pmin, pmax);
+        pmin += triplet->GetTranslation();
+        pmax += triplet->GetTranslation();
+        for (unsigned j=0; j<3; ++j) {
+            lo[j] = std::min(lo[j], pmin[j]);
+            hi[j] = std::max(hi[j], pmax[j]);
+        }
+        volumes.push_back(logical);
+    }
+
+    // pad envelope so that tetrahedra faces never coincide with it
+    center = 0.5 * (lo + hi);
+    const G4ThreeVector half = 0.5 * (hi - lo) * (1 + 1e-6) +
+        G4ThreeVector(1e-3, 1e-3, 1e-3);
+    envelope = new G4LogicalVolume(
+        new G4Box(name, half.x(), half.y(), half.z()),
+        envelope_material, name);
+    G4ThreeVector offset = -center;
+    assembly->MakeImprint(envelope, offset, nullptr);
+}
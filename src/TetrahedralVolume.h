@@ -0,0 +1,43 @@
+// -*- mode: c++; c-file-style: "stroustrup"; c-basic-offset: 4 -*-
+#ifndef TETRAHEDRAL_VOLUME_H
+#define TETRAHEDRAL_VOLUME_H
+
+#include <string>
+#include <vector>
+#include <memory>
+#include <G4ThreeVector.hh>
+
+class G4LogicalVolume;
+class G4Material;
+namespace CADMesh { class TetrahedralMesh; }
+
+// CAD mesh tetrahedralized by CADMesh/TetGen and placed in a box
+// envelope, so navigation queries only the few tetrahedra near a
+// point instead of every facet of one large G4TessellatedSolid.
+//
+// The envelope (named after the volume, made of the surrounding
+// material) is centered on the mesh: place it translated by
+// getCenter() relative to the mesh coordinates.  Tetrahedra are its
+// daughters, each with its own logical volume (see getVolumes()).
+class TetrahedralVolume
+{
+public:
+    TetrahedralVolume(
+        const std::string& filename, const std::string& name,
+        G4Material *material, G4Material *envelope_material,
+        double quality=0.0);
+    G4LogicalVolume* getEnvelope() const { return envelope; }
+    G4ThreeVector getCenter() const { return center; }
+    const std::vector<G4LogicalVolume*>& getVolumes() const {
+        return volumes;
+    }
+    size_t getNumberOfTetrahedra() const { return volumes.size(); }
+private:
+    // mesh owns the TetGen output the tetrahedra were built from
+    std::shared_ptr<CADMesh::TetrahedralMesh> mesh;
+    G4LogicalVolume *envelope;
+    G4ThreeVector center;
+    std::vector<G4LogicalVolume*> volumes;
+};
+
+#endif
@@ -3,9 +3,17 @@
 #include <boost/python/numpy.hpp>
 #include "PhysicsList.h"
 #include "ImportedMagneticField.h"
+#include "FieldSteppers.h"
+#include "ArrayParameterisation.h"
+#include "Regions.h"
+#include "StackingAction.h"
+#include "ImportanceBiasing.h"
 #include <G4VSolid.hh>
 #include <G4SDManager.hh>
 #include <G4AssemblyVolume.hh>
+#include <G4VPhysicalVolume.hh>
+#include <G4LogicalVolume.hh>
+#include <G4Region.hh>
 
 #include "Exception.h"
 #include "pyCADMesh.h"
@@ -25,6 +33,57 @@ template<class T> struct VecToList
     }
 };
 
+namespace pyImportedMagneticField {
+
+// Release GIL for the lifetime of this object
+struct ScopedGILRelease
+{
+    PyThreadState *state;
+    ScopedGILRelease() : state(PyEval_SaveThread()) { }
+    ~ScopedGILRelease() { PyEval_RestoreThread(state); }
+};
+
+np::ndarray evalArray(
+    const ImportedMagneticField& field, const np::ndarray& x)
+{
+    if (x.get_nd() != 2 || x.shape(1) != 3)
+        pbpl_throw("points must have shape (N, 3)");
+    const Py_intptr_t n = x.shape(0);
+    np::ndarray x_d = x.astype(np::dtype::get_builtin<double>());
+    if (!(x_d.get_flags() & np::ndarray::C_CONTIGUOUS))
+        x_d = x_d.copy();
+    np::ndarray result = np::empty(
+        bp::make_tuple(n, 3), np::dtype::get_builtin<double>());
+    const double *px = reinterpret_cast<const double*>(x_d.get_data());
+    double *pB = reinterpret_cast<double*>(result.get_data());
+    {
+        ScopedGILRelease release;
+        field.evalArray(px, pB, n);
+    }
+    return result;
+}
+
+}
+
+namespace pyRegions {
+
+G4Region* createRegion(
+    const std::string& name, const bp::list& volumes, const bp::dict& cuts,
+    double default_cut)
+{
+    std::vector<G4LogicalVolume*> v;
+    for (int i=0; i<bp::len(volumes); ++i)
+        v.push_back(bp::extract<G4LogicalVolume*>(volumes[i]));
+    std::map<std::string, double> c;
+    const bp::list items = cuts.items();
+    for (int i=0; i<bp::len(items); ++i)
+        c[bp::extract<std::string>(items[i][0])] =
+            bp::extract<double>(items[i][1]);
+    return ::createRegion(name, v, c, default_cut);
+}
+
+}
+
 BOOST_PYTHON_MODULE(boost)
 {
     Py_Initialize();
@@ -41,6 +100,10 @@ BOOST_PYTHON_MODULE(boost)
         std::vector<float, class std::allocator<float> >,
         VecToList<float> >();
 
+    bp::to_python_converter<
+        std::vector<double, class std::allocator<double> >,
+        VecToList<double> >();
+
     bp::class_<G4AssemblyVolume, G4AssemblyVolume*, boost::noncopyable>
         ("G4AssemblyVolume", "assembly class", bp::no_init);
 
@@ -53,7 +116,36 @@ BOOST_PYTHON_MODULE(boost)
 
     bp::class_<PhysicsList, boost::shared_ptr<PhysicsList>,
                bp::bases<G4VUserPhysicsList> >
-        ("PhysicsList", "PBPL physics list");
+        ("PhysicsList",
+R"(PBPL physics list.
+
+Particles and PhysicsListEMstd are registered by default.  Add physics
+constructors with registerConstructor() before the run manager is
+initialized; EM constructors replace PhysicsListEMstd.
+)")
+        .def("registerConstructor", &PhysicsList::registerConstructor,
+R"(registerConstructor(name)
+
+Register physics constructor by class name: PhysicsListEMstd, or any
+constructor known to G4PhysicsConstructorRegistry (e.g.,
+G4EmStandardPhysics_option4, G4OpticalPhysics, G4DecayPhysics).  EM
+constructors replace the registered EM physics.
+)")
+        .def("registerImportanceBiasing",
+             &PhysicsList::registerImportanceBiasing,
+R"(registerImportanceBiasing(particle)
+
+Enable geometric importance sampling (splitting and Russian roulette)
+of particle.  Set cell importances with setImportance() once the run
+manager is initialized.
+)");
+
+    bp::def("setImportance", &setImportance,
+R"(setImportance(physical, importance)
+
+Set importance of physical volume (all copies) and all of its
+daughters.  Set the world first, then nested volumes.
+)");
 
     bp::class_<
         ImportedMagneticField, ImportedMagneticField*,
@@ -62,8 +154,10 @@ BOOST_PYTHON_MODULE(boost)
 R"(Represent Geant4 magnetic field using imported data.
 
 * Field is loaded from a pbpl-geant4 HDF5 file.
-* Field data is stored on a uniform Cartesian grid.
-* Field values are linearly interpolated.
+* Field data is stored on a rectilinear Cartesian grid (axes may be
+  non-uniform).
+* Field values are interpolated trilinearly (default) or, on uniform
+  grids, by Catmull-Rom tricubic convolution (see setInterpolation()).
 
 .. code-block:: ipython
 
@@ -77,6 +171,17 @@ R"(Represent Geant4 magnetic field using imported data.
 )")
         .def(bp::init<const std::string&>())
         .def("eval", &ImportedMagneticField::eval)
+        .def("evalArray", &pyImportedMagneticField::evalArray,
+R"(evalArray(x)
+
+Evaluate field at many points in one native loop (GIL is released).
+
+Args:
+  x (ndarray): points, shape (N, 3)
+
+Returns:
+  ndarray: field values, shape (N, 3)
+)")
         .def("dumpInfo", &ImportedMagneticField::dumpInfo)
         .def("loadField", &ImportedMagneticField::loadField,
 R"(loadField(filename)
@@ -87,16 +192,134 @@ Load HDF5 file.  File contains following mandatory datasets:
   * zvals[Nx] (unit=meter)
   * B_field[3, Nx, Ny, Nz] (unit=tesla)
 
+Optional file attributes declare mirror symmetry (see
+``pbpl-geant4-convert-field --mirror``):
+  * mirror[3]: nonzero if field is stored for x[i]>=0 only
+  * mirror_sign[3, 3]: sign of component j at -x[i]
+
+If components that are identically zero are omitted (see
+``pbpl-geant4-convert-field --drop-zero``), B_field is [K, Nx, Ny, Nz]
+and its ``components`` attribute lists the K stored components.
+
+Alternatively, load a field image written by
+``pbpl-geant4-convert-field --image``.  Images are mapped read-only
+and shared between all processes that load the same file (e.g., from
+/dev/shm).
+
 Args:
-  filename (str): HDF5 filename
+  filename (str): HDF5 or field image filename
 )")
         .def("setScalingFactor", &ImportedMagneticField::setScalingFactor,
 R"(setScalingFactor(value)
 
 Args:
   value (float): set scaling factor (initially defaults to 1.0)
+)")
+        .def("setInterpolation", &ImportedMagneticField::setInterpolation,
+R"(setInterpolation(mode)
+
+Args:
+  mode (str): 'linear' (default) or 'cubic'.  Cubic (Catmull-Rom)
+    interpolation requires a uniform grid with at least 4 points per
+    axis.
+)");
+
+    bp::class_<FieldSettings>("FieldSettings",
+R"(Field integrator stepper and propagation tolerances.
+
+Lengths are in Geant4 internal units.  See fieldPreset() and
+configureFieldManager().
+)")
+        .def_readwrite("stepper", &FieldSettings::stepper)
+        .def_readwrite("min_step", &FieldSettings::min_step)
+        .def_readwrite("delta_chord", &FieldSettings::delta_chord)
+        .def_readwrite("delta_one_step", &FieldSettings::delta_one_step)
+        .def_readwrite(
+            "delta_intersection", &FieldSettings::delta_intersection)
+        .def_readwrite("min_epsilon_step", &FieldSettings::min_epsilon_step)
+        .def_readwrite("max_epsilon_step", &FieldSettings::max_epsilon_step);
+
+    bp::def("fieldPreset", &fieldPreset,
+R"(fieldPreset(name)
+
+Return FieldSettings of named preset ('default', 'fast', 'accurate'
+or 'helix').
+)");
+    bp::def("fieldPresetNames", &fieldPresetNames);
+    bp::def("stepperNames", &stepperNames);
+    bp::def("configureFieldManager", &configureFieldManager,
+R"(configureFieldManager(field_manager, field, settings)
+
+Attach field to field_manager with a new chord finder using the
+stepper and tolerances of settings.
+)");
+
+    bp::def("placeArray", &placeArray,
+            bp::return_value_policy<bp::reference_existing_object>(),
+R"(placeArray(name, logical, mother_logical, nx, ny, nz, pitch, transform)
+
+Place nx*ny*nz copies of logical in mother_logical as one
+G4PVParameterised.  Copies are spaced by pitch (G4ThreeVector) and
+centered on transform (G4Transform3D).  Copy number is
+ix + nx*(iy + ny*iz).
 )");
 
+    bp::def("createRegion", &pyRegions::createRegion,
+            bp::return_value_policy<bp::reference_existing_object>(),
+R"(createRegion(name, volumes, cuts, default_cut)
+
+Create G4Region of logical volumes (and their daughters) with its own
+production cuts.
+
+Args:
+  name (str): region name
+  volumes (list): G4LogicalVolume roots of region
+  cuts (dict): range cut of 'gamma', 'e-', 'e+' or 'proton'
+  default_cut (float): range cut of particles not in cuts
+)");
+
+    bp::class_<StackingAction, boost::shared_ptr<StackingAction>,
+               bp::bases<G4UserStackingAction>, boost::noncopyable>
+        ("StackingAction",
+R"(Stacking action that kills and defers tracks in C++.
+
+Secondaries are killed below a per-particle kinetic energy threshold,
+when created outside the region of interest, or beyond the maximum
+generation (primaries are generation 0).  Primaries are never killed.
+Particles with stage > 0 are tracked only after all lower stages.
+Kill counts and killed kinetic energy are tallied per particle and
+reason (see killReasons()), weighted by track weight.  The limits
+apply before importance splitting: clones keep the generation of the
+track they were split from and are never killed.
+)")
+        .def("setThreshold", &StackingAction::setThreshold,
+R"(setThreshold(particle, energy)
+
+Kill secondary particle created with kinetic energy below energy.
+)")
+        .def("setStage", &StackingAction::setStage,
+R"(setStage(particle, stage)
+
+Defer particle to stage (0 = urgent, 1 to 11 = later stages).
+)")
+        .def("setRegionOfInterest", &StackingAction::setRegionOfInterest,
+R"(setRegionOfInterest(lower, upper)
+
+Kill secondaries created outside box [lower, upper] (G4ThreeVector,
+world frame).
+)")
+        .def("setMaxGeneration", &StackingAction::setMaxGeneration,
+R"(setMaxGeneration(n)
+
+Kill secondaries of generation greater than n (negative disables).
+)")
+        .def("killReasons", &StackingAction::killReasons)
+        .staticmethod("killReasons")
+        .def("getKilledParticles", &StackingAction::getKilledParticles)
+        .def("getKillCounts", &StackingAction::getKillCounts)
+        .def("getKilledEnergy", &StackingAction::getKilledEnergy)
+        .def("resetCounts", &StackingAction::resetCounts);
+
     export_CADMesh();
     export_G4MultiSensitiveDetector();
     export_G4MaterialPropertiesTable();
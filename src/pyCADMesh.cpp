@@ -4,12 +4,25 @@
 #include <boost/python/def.hpp>
 #include <boost/python/suite/indexing/map_indexing_suite.hpp>
 #include "Exception.h"
+#include "SolidCache.h"
+#include "TetrahedralVolume.h"
 #include <CADMesh.hh>
+#include <G4LogicalVolume.hh>
+#include <G4Material.hh>
 
 namespace bp = boost::python;
 
 typedef std::map<CADMesh::File::Type, G4String> map_t;
 
+bp::list volumes_to_list(const TetrahedralVolume& tet)
+{
+    bp::list result;
+    bp::reference_existing_object::apply<G4LogicalVolume*>::type convert;
+    for (G4LogicalVolume *x : tet.getVolumes())
+        result.append(bp::object(bp::handle<>(convert(x))));
+    return result;
+}
+
 void export_CADMesh()
 {
     bp::object fileModule(
@@ -68,4 +81,36 @@ OFF        off        Object File Format (OFF)
     bp::scope().attr("Extension") = CADMesh::File::Extension;
     bp::scope().attr("TypeString") = CADMesh::File::TypeString;
     bp::scope().attr("TypeName") = CADMesh::File::TypeName;
+
+    bp::def("writeSolidCache", &writeSolidCache,
+R"(writeSolidCache(solid, filename)
+
+Write facets of tessellated solid to binary cache file.
+)");
+    bp::def("readSolidCache", &readSolidCache,
+            bp::return_value_policy<bp::reference_existing_object>(),
+R"(readSolidCache(filename, name, max_voxels)
+
+Return new G4TessellatedSolid built from cache file.  Like other solids,
+it is owned by G4SolidStore.  max_voxels > 0 sets the voxel budget of
+its navigation voxelization (Geant4 default otherwise).
+)");
+
+    bp::class_<TetrahedralVolume, boost::noncopyable>(
+        "TetrahedralVolume",
+R"(TetrahedralVolume(filename, name, material, envelope_material, quality)
+
+Tetrahedralized CAD mesh placed in a box envelope of envelope_material.
+Place getEnvelope() translated by getCenter() (mesh coordinates).
+getVolumes() lists the logical volume of every tetrahedron.
+quality <= 0 keeps the TetGen default.
+)",
+        bp::init<const std::string&, const std::string&,
+                 G4Material*, G4Material*, double>())
+        .def("getEnvelope", &TetrahedralVolume::getEnvelope,
+             bp::return_value_policy<bp::reference_existing_object>())
+        .def("getCenter", &TetrahedralVolume::getCenter)
+        .def("getVolumes", &volumes_to_list)
+        .def("getNumberOfTetrahedra",
+             &TetrahedralVolume::getNumberOfTetrahedra);
 }
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import h5py
+import pytest
+
+combine_deposition = pytest.importorskip('pbpl.geant4.combine_deposition')
+
+def write_input(path, edep):
+    with h5py.File(path, 'w') as fout:
+        fout['num_events'] = np.full(edep.shape[:2], 10)
+        gout = fout.create_group('Dump')
+        gout['edep'] = edep
+        for name, n in zip(['xbin', 'ybin', 'zbin'], edep.shape[2:]):
+            gout[name] = np.arange(n+1, dtype=float)
+
+def test_chunked_expression(tmp_path, monkeypatch):
+    # np.string_ (used for attributes) was removed in NumPy 2
+    monkeypatch.setattr(np, 'string_', np.bytes_, raising=False)
+    rng = np.random.default_rng(1)
+    A = rng.uniform(0, 1, (2, 3, 7, 4, 5)).astype('float32')
+    B = rng.uniform(0, 1, (2, 3, 7, 4, 5)).astype('float32')
+    write_input(str(tmp_path / 'a.h5'), A)
+    write_input(str(tmp_path / 'b.h5'), B)
+    run_indices = [[0, 1], [1, 0], [1, 2]]
+    conf = {
+        'Input': [
+            { 'Key': 'A', 'Filename': str(tmp_path / 'a.h5'),
+              'Group': 'Dump', 'RunIndices': run_indices },
+            { 'Key': 'B', 'Filename': str(tmp_path / 'b.h5'),
+              'Group': 'Dump', 'RunIndices': run_indices }],
+        'Output': {
+            'Filename': str(tmp_path / 'out.h5'), 'Group': 'Dump',
+            'Expression': '0.25*A + 0.75*sqrt(B)', 'ChunkSize': 3 } }
+    combine_deposition.combine(conf)
+
+    rows = tuple(np.array(run_indices).T)
+    expected = 0.25*A[rows] + 0.75*np.sqrt(B[rows])
+    with h5py.File(conf['Output']['Filename'], 'r') as fin:
+        assert fin['Dump/edep'].shape == expected.shape
+        assert np.allclose(fin['Dump/edep'][()], expected, rtol=1e-6)
+        assert np.array_equal(fin['num_events'][()], [10, 10, 10])
+        assert np.array_equal(fin['Dump/xbin'][()], np.arange(8))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import h5py
+import pytest
+
+convert_field = pytest.importorskip('pbpl.geant4.convert_field')
+
+def write_field(path):
+    x = np.linspace(-2.0, 2.0, 5)
+    y = np.linspace(0.0, 1.0, 3)
+    z = np.linspace(0.0, 3.0, 4)
+    X, Y, Z = np.meshgrid(x, y, z, indexing='ij')
+    # Bx odd, By and Bz even in x
+    B = np.array((X*(1+Z), 1 + X**2 + Y, Z - X**2))
+    with h5py.File(path, 'w') as fout:
+        fout['xvals'] = x
+        fout['yvals'] = y
+        fout['zvals'] = z
+        fout['B_field'] = B
+    return B
+
+def reduce(src, dst, *options):
+    args = convert_field.get_parser().parse_args(list(options) + [src])
+    with h5py.File(src, 'r') as fin, h5py.File(dst, 'w') as fout:
+        convert_field.reduce_field(fin, fout, args)
+
+def test_mirror_twice(tmp_path):
+    full, half, twice = [
+        str(tmp_path / x) for x in ['full.h5', 'half.h5', 'twice.h5']]
+    B = write_field(full)
+    reduce(full, half, '--mirror', 'x=-++')
+    reduce(half, twice, '--mirror', 'x=-++')
+    with h5py.File(half, 'r') as f1, h5py.File(twice, 'r') as f2:
+        for f in [f1, f2]:
+            assert np.array_equal(f.attrs['mirror'], [1, 0, 0])
+            assert np.array_equal(
+                f.attrs['mirror_sign'], [[-1, 1, 1], [1, 1, 1], [1, 1, 1]])
+            assert np.array_equal(f['xvals'][()], [0.0, 1.0, 2.0])
+            assert np.allclose(f['B_field'][()], B[:,2:])
+
+def test_mirror_conflict(tmp_path):
+    full, half, out = [
+        str(tmp_path / x) for x in ['full.h5', 'half.h5', 'out.h5']]
+    write_field(full)
+    reduce(full, half, '--mirror', 'x=-++')
+    with pytest.raises(ValueError):
+        reduce(half, out, '--mirror', 'x=+++')
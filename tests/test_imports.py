@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import sys
+import subprocess
+import importlib.util
+
+def import_without_geant4(statement):
+    # meta path finder that hides Geant4 even when it is installed
+    code = '\n'.join([
+        'import sys',
+        'class Hide:',
+        '    def find_spec(self, name, path=None, target=None):',
+        '        if name.split(".")[0] == "Geant4":',
+        '            raise ModuleNotFoundError(name=name)',
+        'sys.meta_path.insert(0, Hide())',
+        statement,
+        'assert "Geant4" not in sys.modules',
+        'assert "pbpl.geant4.boost" not in sys.modules'])
+    return subprocess.run(
+        [sys.executable, '-c', code], stderr=subprocess.PIPE,
+        universal_newlines=True)
+
+def test_cli_submodules_without_geant4():
+    names = ['extrude_vrml', 'pyramid', 'sum_deposition', 'sparse']
+    if importlib.util.find_spec('pbpl.common') is not None:
+        names += ['convert_field', 'combine_deposition']
+    for name in names:
+        proc = import_without_geant4(
+            'from pbpl.geant4 import {}'.format(name))
+        assert proc.returncode == 0, proc.stderr
+
+def test_helpers_without_geant4():
+    proc = import_without_geant4(
+        'import pbpl.geant4 as g\n'
+        'g.build_transformation\n'
+        'g.storage_options\n'
+        'g.ScanReader')
+    assert proc.returncode == 0, proc.stderr
+
+def test_unknown_name_needs_bindings():
+    proc = import_without_geant4(
+        'import pbpl.geant4 as g\n'
+        'try:\n'
+        '    g.PhysicsList\n'
+        'except ModuleNotFoundError as e:\n'
+        '    assert e.name == "Geant4"\n'
+        'else:\n'
+        '    raise AssertionError')
+    # the assertion that Geant4 was not imported still holds
+    assert proc.returncode == 0, proc.stderr
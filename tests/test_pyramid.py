@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import sys
+import numpy as np
+import h5py
+import toml
+import pytest
+from pbpl.geant4 import pyramid
+
+def block_sum(A, n):
+    # hand-computed 2x2x2 reduction of the last three axes
+    result = np.zeros(A.shape[:-3] + tuple((k+1)//2 for k in n))
+    for i in range(n[0]):
+        for j in range(n[1]):
+            for k in range(n[2]):
+                result[..., i//2, j//2, k//2] += A[..., i, j, k]
+    return result
+
+def write_edep(gout, edep):
+    gout['edep'] = edep
+    gout['edep'].attrs['unit'] = np.bytes_('MeV')
+    for name, n in zip(['xbin', 'ybin', 'zbin'], edep.shape[-3:]):
+        gout[name] = np.linspace(0.0, 1.0, n+1) * (n+1)
+
+def test_odd_axes(tmp_path):
+    edep = np.arange(2*5*3*4, dtype=float).reshape(2, 5, 3, 4)
+    with h5py.File(str(tmp_path / 'edep.h5'), 'w') as fout:
+        write_edep(fout, edep)
+        # slab of 2 x bins exercises slab boundaries with odd Nx
+        pyramid.build_pyramid(fout, slab=2)
+        assert pyramid.pyramid_levels(fout) == [0, 1, 2, 3]
+        level1 = fout['pyramid/1']
+        assert level1['edep'].shape == (2, 3, 2, 2)
+        assert np.allclose(level1['edep'][()], block_sum(edep, (5, 3, 4)))
+        assert level1['edep'].attrs['unit'] == b'MeV'
+        xbin = fout['xbin'][()]
+        assert np.array_equal(level1['xbin'][()], xbin[[0, 2, 4, 5]])
+        ybin = fout['ybin'][()]
+        assert np.array_equal(level1['ybin'][()], ybin[[0, 2, 3]])
+        zbin = fout['zbin'][()]
+        assert np.array_equal(level1['zbin'][()], zbin[[0, 2, 4]])
+        level3 = fout['pyramid/3']
+        assert level3['edep'].shape == (2, 1, 1, 1)
+        assert np.allclose(
+            level3['edep'][()][:,0,0,0], edep.sum(axis=(1, 2, 3)))
+
+def test_reduce_edep_levels(tmp_path, monkeypatch):
+    pytest.importorskip('Geant4.hepunit')
+    from pbpl.geant4 import reduce_edep
+    monkeypatch.setattr(np, 'string_', np.bytes_, raising=False)
+    rng = np.random.default_rng(1)
+    with h5py.File(str(tmp_path / 'in.h5'), 'w') as fout:
+        fout['position'] = rng.uniform(0, 5, (1000, 3))
+        fout['edep'] = rng.uniform(0, 1, 1000)
+        fout['edep'].attrs['num_events'] = 10
+    conf = {
+        'Input': str(tmp_path / 'in.h5'),
+        'Transformation': [[], []],
+        'Indices': [
+            { 'Label': k, 'Unit': 'mm', 'NumBins': n,
+              'LowerEdge': 0.0, 'UpperEdge': 5.0 }
+            for k, n in [('x', 5), ('y', 3), ('z', 4)]],
+        'Output': {
+            'Filename': str(tmp_path / 'out.h5'), 'Group': 'Dump',
+            'PyramidLevels': 1 } }
+    with open(str(tmp_path / 'reduce.toml'), 'w') as f:
+        toml.dump(conf, f)
+    monkeypatch.setattr(
+        sys, 'argv', ['reduce-edep', str(tmp_path / 'reduce.toml')])
+    reduce_edep.main()
+    with h5py.File(conf['Output']['Filename'], 'r') as fin:
+        gin = fin['Dump']
+        assert pyramid.pyramid_levels(gin) == [0, 1]
+        assert np.allclose(
+            gin['pyramid/1/edep'][()],
+            block_sum(gin['edep'][()], (5, 3, 4)), rtol=1e-6)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+import h5py
+from pbpl.geant4 import ScanReader
+
+def write_scan(path):
+    with h5py.File(path, 'w') as fout:
+        # binned axis: 3 runs, 4 edges
+        fout['i0'] = np.array([0.0, 1.0, 2.0, 4.0])
+        fout['i0'].attrs['label'] = np.bytes_('energy')
+        fout['i0'].attrs['unit'] = np.bytes_('MeV')
+        # point axis: 2 runs
+        fout['i1'] = np.array([-1.0, 1.0])
+        fout['i1'].attrs['label'] = np.bytes_('angle')
+        fout['i1'].attrs['unit'] = np.bytes_('deg')
+        fout['num_events'] = np.full((3, 2), 10)
+        edep = np.arange(3*2*2*2*2, dtype=float).reshape(3, 2, 2, 2, 2)
+        fout['edep'] = edep
+        for name in ['xbin', 'ybin', 'zbin']:
+            fout[name] = np.array([0.0, 1.0, 2.0])
+    return edep
+
+def test_edge_axis(tmp_path):
+    path = str(tmp_path / 'scan.h5')
+    write_scan(path)
+    with ScanReader(path) as scan:
+        assert scan.scan_index('energy', 0.9) == 0
+        assert scan.scan_index('energy', 1.0) == 1
+        assert scan.scan_index('energy', 3.9) == 2
+        assert scan.scan_index('energy', 4.0) == 2
+        assert scan.scan_index('energy', -1.0) == 0
+        assert scan.scan_index('energy', 10.0) == 2
+
+def test_point_axis(tmp_path):
+    path = str(tmp_path / 'scan.h5')
+    write_scan(path)
+    with ScanReader(path) as scan:
+        assert scan.scan_index('angle', -0.2) == 0
+        assert scan.scan_index('angle', 0.2) == 1
+
+def test_select(tmp_path):
+    path = str(tmp_path / 'scan.h5')
+    edep = write_scan(path)
+    with ScanReader(path) as scan:
+        A = scan.select(energy=0.9, angle=1.0, x=2.0)
+        assert np.array_equal(A, edep[0, 1, 1])
+        A = scan.select(energy=(0.5, 4.0), z=(0.0, 2.0))
+        assert np.array_equal(A, edep[0:3, :, :, :, 0:2])
+        assert scan.bin_slice('y', 2.0, 2.0) == slice(1, 2)
+
+def test_bin_slice(tmp_path):
+    path = str(tmp_path / 'scan.h5')
+    edep = write_scan(path)
+    with ScanReader(path) as scan:
+        # degenerate ranges on an edge select the containing bin
+        assert scan.bin_slice('x', 0.0, 0.0) == slice(0, 1)
+        assert scan.bin_slice('x', 1.0, 1.0) == slice(1, 2)
+        assert scan.bin_slice('x', 0.5, 1.0) == slice(0, 1)
+        assert scan.bin_slice('x', -1.0, 3.0) == slice(0, 2)
+        A = scan.select(energy=0.9, angle=1.0, x=1.0)
+        assert np.array_equal(A, edep[0, 1, 1])
+        with pytest.raises(ValueError):
+            scan.select(x=2.5)
+        with pytest.raises(ValueError):
+            scan.select(z=-0.1)
+        with pytest.raises(ValueError):
+            scan.bin_slice('y', 3.0, 4.0)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from pbpl.geant4 import sparse
+
+def test_fill_matches_histogramdd():
+    rng = np.random.default_rng(1)
+    edges = [np.linspace(0, 1, 11), np.linspace(-1, 1, 5),
+             np.array([0.0, 0.1, 0.5, 1.0])]
+    hist = sparse.SparseHistogram(edges, min_merge=50)
+    dense = np.zeros([len(q)-1 for q in edges])
+    for i in range(40):
+        x = rng.uniform(-0.2, 1.2, (int(rng.integers(0, 100)), 3))
+        w = rng.uniform(0, 1, len(x))
+        hist.fill(x, w)
+        dense += np.histogramdd(x, edges, weights=w)[0]
+        if i % 7 == 0:
+            # reading merges buffered entries
+            assert np.all(np.diff(hist.index) > 0)
+    result = np.zeros(dense.size)
+    result[hist.index] = hist.value
+    assert np.allclose(result.reshape(dense.shape), dense)
+
+def test_merge_is_batched():
+    edges = [np.linspace(0, 1, 101)]
+    hist = sparse.SparseHistogram(edges, min_merge=0)
+    hist.fill(np.full((100, 1), 0.5), np.ones(100))
+    assert len(hist.pending) == 0 and len(hist.index) == 1
+    hist.fill(np.full((1, 1), 0.25), np.ones(1))
+    # buffer (1) not larger than nnz (1): not merged yet
+    assert len(hist.pending) == 1
+    hist.fill(np.full((1, 1), 0.75), np.ones(1))
+    assert len(hist.pending) == 0
+    assert np.allclose(hist.value, [1.0, 100.0, 1.0])
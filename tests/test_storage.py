@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import h5py
+from pbpl.geant4 import create_dataset, storage_options, sparse
+
+storage = {
+    'Chunks': [1024, 3], 'Compression': 'gzip', 'CompressionLevel': 4,
+    'Shuffle': True, 'Precision': 'float32' }
+
+def test_empty_dataset(tmp_path):
+    assert storage_options(storage, (0, 3)) == {'dtype': 'float32'}
+    with h5py.File(str(tmp_path / 'out.h5'), 'w') as fout:
+        dset = create_dataset(fout, 'position', np.zeros((0, 3)), storage)
+        assert dset.shape == (0, 3)
+        assert dset.dtype == np.float32
+
+def test_chunks_clamped(tmp_path):
+    options = storage_options(storage, (10, 3))
+    assert options['chunks'] == (10, 3)
+    assert options['compression'] == 'gzip'
+    with h5py.File(str(tmp_path / 'out.h5'), 'w') as fout:
+        dset = create_dataset(fout, 'position', np.ones((10, 3)), storage)
+        assert dset.chunks == (10, 3)
+
+def test_coo_chunks(tmp_path, monkeypatch):
+    # np.string_ (used for attributes) was removed in NumPy 2
+    monkeypatch.setattr(np, 'string_', np.bytes_, raising=False)
+    with h5py.File(str(tmp_path / 'out.h5'), 'w') as fout:
+        for name, nnz in [('empty', 0), ('one', 1)]:
+            gout = sparse.write_coo(
+                fout, name, np.arange(nnz), np.ones(nnz), (10,), 1, 'MeV',
+                **storage_options(storage, (nnz,)))
+            for dset_name in ['index', 'value']:
+                assert gout[dset_name].chunks == (sparse.chunk_size,)
+            sparse.append_coo(gout, [5, 6], [1.0, 2.0])
+            assert len(gout['value']) == nnz + 2